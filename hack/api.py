@@ -1,13 +1,20 @@
 import os
 import json
+import time
 from datetime import datetime
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 from typing import Optional, List
 import pandas as pd
 import threading
 from send_sms import send_twilio_message
+from txlog import TransactionLog, RecentRows, TXLOG_DIR
+from columnar import use_parquet, read_tail, SegmentCompactor, HISTORY_PARQUET_DIR
+from write_behind import WriteBehindQueue
+from metrics import REGISTRY
 
 
 app = FastAPI(title="Fraud Analysis API")
@@ -24,8 +31,21 @@ app.add_middleware(
 # Path constants
 DATA_DIR = "data"
 LATEST_FILE = os.path.join(DATA_DIR, "latest_transactions.csv")
+# History written before the transaction log existed; read, never rewritten
 HISTORY_FILE = os.path.join(DATA_DIR, "transaction_history.csv")
 
+# Most transactions accepted by one POST /transactions/batch
+BATCH_MAX_TRANSACTIONS = int(os.getenv("BATCH_MAX_TRANSACTIONS", "10000"))
+# Fraud alerts waiting to be sent; alerts beyond this are dropped and counted
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "10000"))
+# Transactions waiting to be committed before ingest requests get a 429
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "50000"))
+# A group commit happens once this many transactions are waiting, or this long after the first one
+INGEST_COMMIT_ROWS = int(os.getenv("INGEST_COMMIT_ROWS", "500"))
+INGEST_COMMIT_MS = float(os.getenv("INGEST_COMMIT_MS", "20"))
+
+COMMIT_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
 # Create data directory if it doesn't exist
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -62,6 +82,37 @@ class Transaction(BaseModel):
         }
 
 
+# Append-only transaction history, with its newest rows kept in memory for GET /transactions/
+recent_transactions = RecentRows()
+transaction_log = TransactionLog(list(Transaction.__fields__), directory=TXLOG_DIR, recent=recent_transactions)
+
+
+# With HISTORY_FORMAT=parquet, sealed segments are compacted into date-partitioned Parquet
+compactor = None
+if use_parquet():
+    compactor = SegmentCompactor(transaction_log, HISTORY_PARQUET_DIR)
+    transaction_log.on_seal = compactor.submit
+
+
+def format_cursor(position):
+    return f"{position[0]}:{position[1]}"
+
+
+def parse_cursor(cursor):
+    """
+    Returns:
+        tuple: The (segment number, byte offset) position in a cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    segment, offset = cursor.split(":")
+    position = int(segment), int(offset)
+    if min(position) < 0:
+        raise ValueError(cursor)
+    return position
+
+
 def send_fraud_alert(transaction: Transaction):
     """
     Send an SMS alert for a fraudulent transaction.
@@ -94,61 +145,222 @@ def send_fraud_alert(transaction: Transaction):
         print(f"Error sending fraud alert: {str(e)}")
 
 
-def process_transaction(transaction: Transaction):
+def send_fraud_alerts(transactions):
+    for transaction in transactions:
+        send_fraud_alert(transaction)
+
+
+# Sends fraud alerts one at a time, off the request and commit paths
+alert_queue = WriteBehindQueue(send_fraud_alerts, max_size=ALERT_QUEUE_SIZE, max_batch=100, max_delay=0,
+                               max_retries=1, name="fraud-alerts")
+
+
+def save_transactions(transactions):
     """
-    Process a new transaction and save it to the data files.
+    Save transactions to the data files with one write to the transaction log.
 
-    Also sends fraud alerts if the transaction is predicted to be fraudulent.
+    Args:
+        transactions (list): Transaction models; missing timestamps are set to now
     """
     global new_data_available
 
     # Add timestamp if not provided
-    if not transaction.Timestamp:
-        transaction.Timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    # Convert transaction to DataFrame
-    transaction_df = pd.DataFrame([transaction.dict()])
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for transaction in transactions:
+        if not transaction.Timestamp:
+            transaction.Timestamp = now
+    rows = [transaction.dict() for transaction in transactions]
 
     # Save to latest transactions file
-    transaction_df.to_csv(LATEST_FILE, index=False)
-
-    # Append to history file
-    if os.path.exists(HISTORY_FILE):
-        # Read existing history
-        history_df = pd.read_csv(HISTORY_FILE)
-
-        # Append new transaction
-        updated_history = pd.concat([history_df, transaction_df], ignore_index=True)
+    pd.DataFrame(rows).to_csv(LATEST_FILE, index=False)
 
-        # Save updated history
-        updated_history.to_csv(HISTORY_FILE, index=False)
-    else:
-        # Create new history file
-        transaction_df.to_csv(HISTORY_FILE, index=False)
+    # Append to the transaction log
+    transaction_log.append(rows)
 
     # Set flag for new data
     with new_data_lock:
         new_data_available = True
 
-    # Send fraud alert if predicted fraud
-    if transaction.is_fraud_predicted:
-        send_fraud_alert(transaction)
+
+def queue_fraud_alerts(transactions):
+    dropped = sum(not alert_queue.put(transaction) for transaction in transactions
+                  if transaction.is_fraud_predicted)
+    if dropped:
+        print(f"Alert queue full, dropped {dropped} fraud alerts")
+
+
+commit_sizes = REGISTRY.histogram("ingest_commit_size", "Transactions per group commit", buckets=COMMIT_SIZE_BUCKETS)
+commit_seconds = REGISTRY.histogram("ingest_commit_duration_seconds", "Time to write and fsync one group commit")
+
+
+def commit_transactions(transactions):
+    """
+    Group commit: save queued transactions with one log append and one fsync, then queue their fraud alerts.
+    """
+    start = time.perf_counter()
+    save_transactions(transactions)
+    transaction_log.sync()
+    commit_seconds.observe(time.perf_counter() - start)
+    commit_sizes.observe(len(transactions))
+    queue_fraud_alerts(transactions)
+
+
+# The only writer of the transaction history; requests queue transactions for it. A commit appends to the
+# log, so a failed one is not retried: it could have been written before failing
+ingest_queue = WriteBehindQueue(commit_transactions, max_size=INGEST_QUEUE_SIZE, max_batch=INGEST_COMMIT_ROWS,
+                                max_delay=INGEST_COMMIT_MS / 1000, max_retries=1, name="ingest-writer")
+REGISTRY.callback("ingest_queue_depth", "Transactions waiting to be committed", "gauge", ingest_queue.depth)
+REGISTRY.callback("ingest_rejected_total", "Transactions refused because the ingest queue was full or stopped",
+                  "counter", lambda: ingest_queue.rejected)
+REGISTRY.callback("fraud_alert_queue_depth", "Fraud alerts waiting to be sent", "gauge", alert_queue.depth)
+
+
+@app.on_event("startup")
+def start_ingest():
+    if compactor is not None:
+        compactor.start()
+    alert_queue.start()
+    ingest_queue.start()
+
+
+@app.on_event("shutdown")
+def stop_ingest():
+    # Commit everything still queued, then send its alerts, then seal the log
+    ingest_queue.stop()
+    alert_queue.stop(timeout=30)
+    transaction_log.close()
+    if compactor is not None:
+        compactor.stop()
+
+
+def enqueue_transactions(transactions):
+    """
+    Queue transactions for the ingest writer, all or none of them, to be committed together.
+
+    Raises:
+        HTTPException: 429 if the queue lacks room, 503 if ingest has stopped
+    """
+    if ingest_queue.put_many(transactions):
+        return
+    if not ingest_queue.running:
+        raise HTTPException(status_code=503, detail="Ingest is not running")
+    raise HTTPException(status_code=429, detail="Ingest queue is full, retry later", headers={"Retry-After": "1"})
+
+
+def decode_batch(body, ndjson=False):
+    """
+    Decode the body of a batch ingest request.
+
+    Args:
+        body (bytes): A JSON array of transactions, or one transaction per line if ndjson
+        ndjson (bool): Whether the body is newline-delimited JSON
+
+    Returns:
+        list: The decoded items; NDJSON lines that are not valid JSON are returned as their JSONDecodeError
+
+    Raises:
+        ValueError: If a JSON body is not valid JSON or not an array
+    """
+    if not ndjson:
+        items = json.loads(body)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of transactions")
+        return items
+
+    items = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            items.append(e)
+    return items
+
+
+def validate_batch(items):
+    """
+    Validate decoded transactions, keeping the valid ones and the errors of the rest.
+
+    Returns:
+        tuple: (list of Transactions, list of {"index", "errors"} for each rejected item)
+    """
+    transactions = []
+    errors = []
+    for index, item in enumerate(items):
+        if isinstance(item, json.JSONDecodeError):
+            errors.append({"index": index, "errors": [{"loc": [], "msg": f"Invalid JSON: {item.msg}",
+                                                       "type": "value_error.jsondecode"}]})
+            continue
+        try:
+            transactions.append(Transaction.parse_obj(item))
+        except ValidationError as e:
+            errors.append({"index": index, "errors": e.errors()})
+    return transactions, errors
+
+
+def ingest_batch(items):
+    """
+    Validate a batch and queue its valid transactions for the ingest writer.
+
+    Returns:
+        dict: Counts of received, accepted, rejected and fraud-flagged transactions, plus the errors
+
+    Raises:
+        HTTPException: 429 or 503 if the valid transactions cannot be queued
+    """
+    transactions, errors = validate_batch(items)
+    if transactions:
+        enqueue_transactions(transactions)
+    return {
+        "status": "accepted" if transactions else "rejected",
+        "received": len(items),
+        "accepted": len(transactions),
+        "rejected": len(errors),
+        "flagged": sum(1 for transaction in transactions if transaction.is_fraud_predicted),
+        "errors": errors
+    }
 
 
 @app.post("/transactions/", status_code=202)
-async def add_transaction(background_tasks: BackgroundTasks, transaction: Transaction):
+async def add_transaction(transaction: Transaction):
     """
     Add a new transaction to the system.
 
-    This endpoint accepts transaction data and processes it in the background.
-    If the transaction is flagged as fraudulent, a notification will be sent.
+    This endpoint queues the transaction for the ingest writer, which commits
+    it within INGEST_COMMIT_MS. If the transaction is flagged as fraudulent,
+    a notification will be sent. Returns 429 when the queue is full.
     """
-    # Process transaction in a background task
-    background_tasks.add_task(process_transaction, transaction)
+    enqueue_transactions([transaction])
 
     return {"status": "accepted", "message": "Transaction is being processed"}
 
 
+@app.post("/transactions/batch", status_code=202)
+async def add_transactions(request: Request):
+    """
+    Add a batch of transactions with a single write.
+
+    The body is a JSON array of transactions, or one transaction per line with
+    an application/x-ndjson content type. Valid transactions are queued for
+    the ingest writer as one group, which it always commits with one log
+    append and fsync even when the group is larger than INGEST_COMMIT_ROWS.
+    Valid transactions are accepted even if others in the batch are rejected,
+    and fraud alerts are sent for the ones flagged as fraudulent.
+    """
+    body = await request.body()
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    try:
+        items = decode_batch(body, ndjson)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch: {str(e)}")
+    if len(items) > BATCH_MAX_TRANSACTIONS:
+        raise HTTPException(status_code=413,
+                            detail=f"A batch can hold at most {BATCH_MAX_TRANSACTIONS} transactions")
+
+    return await run_in_threadpool(ingest_batch, items)
+
+
 @app.get("/health/")
 async def healthcheck():
     """
@@ -158,31 +370,52 @@ async def healthcheck():
 
 
 @app.get("/transactions/")
-async def get_transactions(limit: int = 100):
+def get_transactions(limit: int = 100, cursor: Optional[str] = None):
     """
     Get the latest transactions.
 
     This endpoint returns the most recent transactions, up to the specified limit.
+    Passing a response's next_cursor as cursor returns the transactions just
+    before that page; next_cursor is None once the oldest transaction is reached.
     """
-    if os.path.exists(HISTORY_FILE):
+    before = None
+    if cursor:
         try:
-            df = pd.read_csv(HISTORY_FILE)
-            if len(df) > limit:
-                df = df.tail(limit)
-
-            # Convert boolean columns explicitly
-            if 'is_fraud_predicted' in df.columns:
-                df['is_fraud_predicted'] = df['is_fraud_predicted'].astype(bool)
-            if 'is_fraud_reported' in df.columns:
-                df['is_fraud_reported'] = df['is_fraud_reported'].astype(bool)
-
-            # Convert DataFrame to list of dictionaries
-            transactions = df.to_dict(orient='records')
-            return {"transactions": transactions, "count": len(transactions)}
+            before = parse_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+    # Newest rows come from memory, older ones from the end of the history files
+    entries = recent_transactions.before(before, limit)
+    transactions = [row for _, row in entries]
+    positions = [position for position, _ in entries]
+    if len(entries) < limit:
+        try:
+            older, older_positions = read_tail(limit - len(entries), positions[0] if positions else before,
+                                               HISTORY_PARQUET_DIR, TXLOG_DIR, legacy_file=HISTORY_FILE)
         except Exception as e:
             return {"error": f"Failed to read transactions: {str(e)}"}
 
-    return {"transactions": [], "count": 0}
+        # Convert boolean columns explicitly
+        for row in older:
+            for column in ['is_fraud_predicted', 'is_fraud_reported']:
+                if column in row:
+                    row[column] = bool(row[column])
+        transactions = older + transactions
+        positions = older_positions + positions
+
+    next_cursor = format_cursor(positions[0]) if positions and len(transactions) >= limit else None
+    return {"transactions": transactions, "count": len(transactions), "next_cursor": next_cursor}
+
+
+@app.get("/stats/ingest")
+def ingest_stats():
+    return {"ingest": ingest_queue.stats(), "alerts": alert_queue.stats(), "log": transaction_log.stats()}
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
 def has_new_data():
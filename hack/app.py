@@ -10,7 +10,9 @@ import os
 import threading
 import time
 import logging
-from utils import filter_data, process_data, calculate_metrics, get_time_granularity
+from utils import REQUIRED_COLUMNS, filter_data, process_data, calculate_metrics, get_time_granularity
+from txlog import read_log
+from columnar import use_parquet, to_table, read_history, read_snapshot, HISTORY_SNAPSHOT_FILE
 from dotenv import load_dotenv
 
 # Set up logging
@@ -70,6 +72,12 @@ if 'data' not in st.session_state:
     st.session_state.data = None
 if 'date_range' not in st.session_state:
     st.session_state.date_range = None
+# Date range the history in st.session_state.data was loaded for, None if it holds every date
+if 'history_range' not in st.session_state:
+    st.session_state.history_range = None
+# Earliest and latest dates seen so far, so a narrower reload does not shrink the date filter
+if 'date_bounds' not in st.session_state:
+    st.session_state.date_bounds = None
 if 'payer_id' not in st.session_state:
     st.session_state.payer_id = None
 if 'payee_id' not in st.session_state:
@@ -86,6 +94,57 @@ if 'refresh_interval' not in st.session_state:
     st.session_state.refresh_interval = 5  # Default refresh interval in seconds
 
 
+def load_history(date_range=None):
+    """
+    Load the saved history file followed by the rows the API has appended to its transaction log.
+
+    Only the columns the dashboard uses are read. With Parquet history, only
+    the partitions for the selected dates are opened.
+
+    Args:
+        date_range (tuple): First and last date to load, every date if omitted
+
+    Returns:
+        DataFrame: The history, or None if neither exists
+    """
+    start = end = None
+    if date_range is not None and len(date_range) == 2:
+        start = pd.Timestamp(date_range[0])
+        end = pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)
+
+    frames = []
+    if os.path.exists(HISTORY_FILE):
+        frames.append(pd.read_csv(HISTORY_FILE, usecols=lambda column: column in REQUIRED_COLUMNS))
+    if use_parquet():
+        if frames:
+            frames[0] = to_table(frames[0]).to_pandas()
+        log_data = read_history(columns=REQUIRED_COLUMNS, start=start, end=end)
+        if not log_data.empty:
+            frames.append(log_data)
+    else:
+        log_data = read_log(columns=REQUIRED_COLUMNS)
+        if log_data is not None:
+            frames.append(log_data)
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_database_snapshot():
+    """
+    Load the newest transactions db_connector saved from the database.
+
+    Returns:
+        DataFrame: The transactions, or None if none have been saved
+    """
+    if use_parquet():
+        if os.path.exists(HISTORY_SNAPSHOT_FILE):
+            return read_snapshot(HISTORY_SNAPSHOT_FILE)
+    elif os.path.exists(HISTORY_FILE):
+        return pd.read_csv(HISTORY_FILE)
+    return None
+
+
 # Function to check for and load new data
 def check_for_new_data():
     """Check if new data is available and load it if it is."""
@@ -94,18 +153,20 @@ def check_for_new_data():
         if USE_DATABASE:
             if update_transactions():
                 # After updating data files, load the new data
-                if os.path.exists(HISTORY_FILE):
-                    new_data = pd.read_csv(HISTORY_FILE)
+                new_data = load_database_snapshot()
+                if new_data is not None:
                     st.session_state.data = new_data
+                    st.session_state.history_range = None
                     st.success("Real-time data updated successfully from database!")
                     return True
 
         # Otherwise check for updates via the flag
         elif has_new_data():
-            # Load new data from the latest transactions file
-            if os.path.exists(HISTORY_FILE):
-                new_data = pd.read_csv(HISTORY_FILE)
+            # Load new data from the transaction history
+            new_data = load_history(st.session_state.date_range)
+            if new_data is not None:
                 st.session_state.data = new_data
+                st.session_state.history_range = st.session_state.date_range
                 st.success("Real-time data updated successfully!")
 
                 # Reset the new data flag
@@ -129,8 +190,8 @@ if st.session_state.data is None:
             if update_transactions():
                 logger.info("Successfully updated transactions from MySQL database")
 
-                if os.path.exists(HISTORY_FILE):
-                    data = pd.read_csv(HISTORY_FILE)
+                data = load_database_snapshot()
+                if data is not None:
                     if not data.empty:
                         # Process data to ensure it has required columns
                         data = process_data(data)
@@ -149,15 +210,16 @@ if st.session_state.data is None:
             logger.error(f"Database connection error: {e}")
 
     # If database loading failed or not available, try loading from file
-    if st.session_state.data is None and os.path.exists(HISTORY_FILE):
+    if st.session_state.data is None:
         try:
-            data = pd.read_csv(HISTORY_FILE)
-            if not data.empty:
+            data = load_history(st.session_state.date_range)
+            if data is not None and not data.empty:
                 # Process data to ensure it has required columns
                 data = process_data(data)
 
                 # Store in session state
                 st.session_state.data = data
+                st.session_state.history_range = st.session_state.date_range
 
                 # Display success message
                 st.success(f"Successfully loaded {len(data)} transactions from saved data file")
@@ -230,6 +292,7 @@ if uploaded_file is not None:
 
         # Store in session state
         st.session_state.data = data
+        st.session_state.history_range = None
 
         # Display success message
         st.success(f"Successfully loaded data with {len(data)} transactions")
@@ -246,6 +309,10 @@ if st.session_state.data is not None:
     # Get min and max dates for filters
     min_date = pd.to_datetime(data['Timestamp']).min().date()
     max_date = pd.to_datetime(data['Timestamp']).max().date()
+    if st.session_state.date_bounds is not None:
+        min_date = min(min_date, st.session_state.date_bounds[0])
+        max_date = max(max_date, st.session_state.date_bounds[1])
+    st.session_state.date_bounds = (min_date, max_date)
 
     # Sidebar for filters
     st.sidebar.header("Filters")
@@ -261,6 +328,15 @@ if st.session_state.data is not None:
     if len(date_range) == 2:
         st.session_state.date_range = date_range
 
+        # History loaded for a narrower range has to be reloaded to cover the new one
+        loaded_range = st.session_state.history_range
+        if loaded_range is not None and (date_range[0] < loaded_range[0] or date_range[1] > loaded_range[1]):
+            reloaded = load_history(date_range)
+            if reloaded is not None and not reloaded.empty:
+                st.session_state.data = process_data(reloaded)
+                st.session_state.history_range = date_range
+                st.rerun()
+
     # Payer ID filter
     payer_ids = sorted(data['Payer_ID'].astype(str).unique().tolist())
 
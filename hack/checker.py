@@ -1,14 +1,50 @@
-import mysql.connector
 import os
+import json
+import time
+import logging
 from dotenv import load_dotenv
 import fastapi
 import uvicorn
+from fastapi import Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
+from rule_index import RuleCache
+from rule_snapshot import RULES_SNAPSHOT_DIR, RuleSnapshot
+from storage import get_storage
+from write_behind import WriteBehindQueue
+import model_scorer
+from micro_batcher import MicroBatcher
+from result_cache import ResultCache
+import fastjson
+from fastjson import FAST_JSON, FastJSONResponse, to_dict
+from metrics import REGISTRY, ServerTimingMiddleware, record_since_request_start, stage
 
 app = fastapi.FastAPI()
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Write-behind mode: /detect returns before its row is committed
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "50"))
+WRITE_BEHIND_PUT_TIMEOUT = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT", "0.1"))
+
+# Score transactions with the autoencoder next to the rules. Off by default: the encoder artifacts
+# in MODEL_FEATURES_PATH are generated from the training data, see model_scorer.py
+MODEL_ENABLED = os.getenv("MODEL_ENABLED", "false").lower() in ("1", "true", "yes")
+# Concurrent /detect requests share one forward pass of up to this many rows, waiting at most this long
+MODEL_BATCH_MAX_SIZE = int(os.getenv("MODEL_BATCH_MAX_SIZE", "64"))
+MODEL_BATCH_MAX_WAIT_MS = float(os.getenv("MODEL_BATCH_MAX_WAIT_MS", "2"))
+
+# Lines scored and committed together by /detect/stream
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# Uvicorn worker processes; with more than one, set RULES_SNAPSHOT_DIR so only one of them polls fraud_rules
+CHECKER_WORKERS = int(os.getenv("CHECKER_WORKERS", "1"))
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,22 +53,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USERNAME"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_DB")
-    )
+# Per-stage timings for /metrics and each response's Server-Timing header
+app.add_middleware(ServerTimingMiddleware)
 
 def fetch_rules():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM fraud_rules WHERE is_active = 1")
-    rules = cursor.fetchall()
-    conn.close()
-    return rules
+    return get_storage().fetch_rules()
+
+def fetch_rules_fingerprint():
+    return get_storage().fetch_rules_fingerprint()
+
+# Rule changes reach every worker within RULES_REFRESH_INTERVAL + RULES_SNAPSHOT_POLL_INTERVAL seconds.
+# Velocity windows are per process, so velocity rules are only enforced with a single worker.
+rule_cache = RuleCache(fetch_rules, fetch_rules_fingerprint,
+                       snapshot=RuleSnapshot() if RULES_SNAPSHOT_DIR else None,
+                       velocity_enabled=CHECKER_WORKERS == 1)
+
+@app.on_event("startup")
+def start_rule_refresher():
+    rule_cache.get()
+    rule_cache.start()
+
+@app.on_event("shutdown")
+def stop_rule_refresher():
+    rule_cache.stop()
 
 class Transaction(BaseModel):
     transaction_id: str
@@ -48,84 +91,276 @@ class Transaction(BaseModel):
     payer_browser: Optional[str] = None
     payee_id: Optional[str] = None
 
+scorer = None
+model_batcher = None
+
+@app.on_event("startup")
+def load_fraud_model():
+    # Loaded once per worker; detection falls back to rules only if it is unavailable
+    global scorer, model_batcher
+    if MODEL_ENABLED:
+        scorer = model_scorer.load_scorer()
+    if scorer is not None:
+        model_batcher = MicroBatcher(
+            lambda transactions: scorer.score_batch(transactions).tolist(),
+            max_batch_size=MODEL_BATCH_MAX_SIZE,
+            max_wait=MODEL_BATCH_MAX_WAIT_MS / 1000,
+            name="model-batcher"
+        )
+        model_batcher.start()
+
+@app.on_event("shutdown")
+def stop_model_batcher():
+    if model_batcher is not None:
+        model_batcher.stop()
+    if scorer is not None and scorer.online is not None:
+        # Writes a final checkpoint of the live counts
+        scorer.online.stop()
+
 def check_transaction(transaction: dict):
-    rules = fetch_rules()
-    is_fraud = False
-    fraud_reasons = []
-    transaction_id = transaction.get("transaction_id")
-    
-    for rule in rules:
-        rule_type = rule.get("rule_type", "")
-        threshold = rule.get("threshold", None)
-        blocked_ip = rule.get("blocked_ip", None)
-        blocked_browser = rule.get("blocked_payer_browser", None)
-        blocked_gateway = rule.get("blocked_payment_gateway", None)
-        blocked_email = rule.get("blocked_email", None)
-
-        if rule_type == "Threshold Value" and threshold is not None:
-            if transaction.get("transaction_amount", 0) > float(threshold):
-                is_fraud = True
-                fraud_reasons.append(f"High transaction amount (> {threshold})")
-
-        if blocked_ip and transaction.get("payer_ip") == blocked_ip:
-            is_fraud = True
-            fraud_reasons.append(f"Blocked IP: {blocked_ip}")
-
-        if blocked_browser and transaction.get("payer_browser") == blocked_browser:
-            is_fraud = True
-            fraud_reasons.append(f"Blocked Browser: {blocked_browser}")
-
-        if blocked_gateway and transaction.get("payment_gateway_bank") == blocked_gateway:
-            is_fraud = True
-            fraud_reasons.append(f"Blocked Payment Gateway: {blocked_gateway}")
-
-        if blocked_email and transaction.get("payer_email") == blocked_email:
-            is_fraud = True
-            fraud_reasons.append(f"Blocked Email: {blocked_email}")
-
-    return {"transaction_id": transaction_id, "is_fraud": is_fraud, "fraud_source": "rule", "fraud_reasons": fraud_reasons}
+    with stage("fetch_rules"):
+        index = rule_cache.get()
+    with stage("rules"):
+        result = index.check(transaction)
+    if scorer is not None:
+        with stage("model"):
+            if model_batcher is not None and model_batcher.running:
+                score = model_batcher.submit(transaction).result()
+            else:
+                score = scorer.score(transaction)
+            scorer.annotate(result, score)
+    count_verdicts([result])
+    return result
 
-def upload_transaction(transaction: Transaction, result):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = """
-    INSERT INTO transactions (
-        transaction_id_anonymous, transaction_date, transaction_amount, transaction_channel, 
-        transaction_payment_mode_anonymous, payment_gateway_bank_anonymous, payer_email_anonymous, payer_mobile_anonymous, 
-        payer_browser_anonymous, payee_id, is_fraud, payee_ip_anonymous
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
-    values = (
+def check_transactions(transactions: List[dict]):
+    with stage("fetch_rules"):
+        index = rule_cache.get()
+    with stage("rules"):
+        results = index.check_batch(transactions)
+    if scorer is not None:
+        with stage("model"):
+            for result, score in zip(results, scorer.score_batch(transactions)):
+                scorer.annotate(result, score)
+    count_verdicts(results)
+    return results
+
+def count_verdicts(results):
+    flagged = sum(1 for result in results if result["is_fraud"])
+    REGISTRY.counter("fraud_verdicts_total", "Transactions checked, by verdict", is_fraud="true").inc(flagged)
+    REGISTRY.counter("fraud_verdicts_total", "Transactions checked, by verdict",
+                     is_fraud="false").inc(len(results) - flagged)
+
+def transaction_row(transaction: Transaction, result):
+    # Values in storage.TRANSACTION_COLUMNS order
+    return (
         transaction.transaction_id, transaction.transaction_date, transaction.transaction_amount,
         transaction.transaction_channel, transaction.transaction_payment_mode, transaction.payment_gateway_bank,
         transaction.payer_email, transaction.payer_mobile,transaction.payer_browser, transaction.payee_id, result,None
     )
-    cursor.execute(query, values)
-    conn.commit()
-    conn.close()
-
-@app.post("/detect")
-def detect(transaction: Transaction):
-    transaction_dict = transaction.dict()
-    result = check_transaction(transaction_dict)
-    upload_transaction(transaction, result["is_fraud"])
-    return result
+
+def upload_transaction(transaction: Transaction, result):
+    get_storage().insert_transactions([transaction_row(transaction, result)])
+
+def upload_transactions(rows, chunk_size=None):
+    # One database transaction for the whole batch; rows already stored for a transaction_id are skipped
+    get_storage().insert_transactions(rows, chunk_size)
+
+transaction_writer = WriteBehindQueue(
+    upload_transactions,
+    max_size=WRITE_BEHIND_QUEUE_SIZE,
+    max_batch=WRITE_BEHIND_BATCH_SIZE,
+    max_delay=WRITE_BEHIND_MAX_DELAY_MS / 1000,
+    # Rows already stored are skipped, so a failed group can safely be written again
+    max_retries=3,
+    name="transaction-writer"
+)
+
+REGISTRY.callback("fraud_write_behind_queue_depth", "Rows waiting in the write-behind queue", "gauge",
+                  transaction_writer.depth)
+
+@app.on_event("startup")
+def start_transaction_writer():
+    if WRITE_BEHIND:
+        transaction_writer.start()
+
+@app.on_event("shutdown")
+def stop_transaction_writer():
+    # Drains everything still queued before the process exits
+    transaction_writer.stop()
+
+# Verdicts already returned, so client retries skip both evaluation and the insert
+result_cache = ResultCache()
+REGISTRY.callback("fraud_result_cache_lookups_total", "Result cache lookups by transaction_id", "counter",
+                  lambda: {(("result", "hit"),): result_cache.hits, (("result", "miss"),): result_cache.misses})
+
+@app.get("/stats/write-behind")
+def write_behind_stats():
+    return transaction_writer.stats()
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/db-pool")
+def db_pool_stats():
+    return get_storage().stats()
+
+@app.get("/stats/result-cache")
+def result_cache_stats():
+    return result_cache.stats()
+
+@app.get("/stats/model-batching")
+def model_batching_stats():
+    return model_batcher.stats() if model_batcher is not None else {}
 
 class BatchTransactionRequest(BaseModel):
     transactions: List[Transaction]
 
-@app.post("/batchdetect")
-def batch_detect(request: BatchTransactionRequest):
+def detect_transaction(transaction):
+    cached = result_cache.get(transaction.transaction_id)
+    if cached is not None:
+        return cached
+    result = check_transaction(to_dict(transaction))
+    row = transaction_row(transaction, result["is_fraud"])
+    with stage("store"):
+        # Fall back to a synchronous insert when write-behind is off or its queue is full
+        if not (WRITE_BEHIND and transaction_writer.put(row, timeout=WRITE_BEHIND_PUT_TIMEOUT)):
+            upload_transaction(transaction, result["is_fraud"])
+    result_cache.put(transaction.transaction_id, result)
+    return result
+
+def batch_detect_transactions(transactions):
     results = {}
-    for transaction in request.transactions:
-        transaction_dict = transaction.dict()
-        result = check_transaction(transaction_dict)
-        upload_transaction(transaction, result["is_fraud"])
+    verdicts = {}
+    pending = []
+    for transaction in transactions:
+        cached = result_cache.get(transaction.transaction_id)
+        if cached is not None:
+            verdicts[transaction.transaction_id] = cached
+        else:
+            pending.append(transaction)
+
+    rows = []
+    batch_results = check_transactions([to_dict(transaction) for transaction in pending])
+    for transaction, result in zip(pending, batch_results):
+        rows.append(transaction_row(transaction, result["is_fraud"]))
+        verdicts[transaction.transaction_id] = result
+    with stage("store"):
+        upload_transactions(rows)
+    for transaction, result in zip(pending, batch_results):
+        result_cache.put(transaction.transaction_id, result)
+
+    for transaction in transactions:
+        result = verdicts[transaction.transaction_id]
         results[transaction.transaction_id] = {
             "is_fraud": result["is_fraud"],
             "fraud_reason": ", ".join(result["fraud_reasons"])
         }
     return results
 
+if FAST_JSON and fastjson.available():
+    # Bodies are decoded with msgspec, falling back to the pydantic models for anything it rejects
+    transaction_decoder = fastjson.FastDecoder(Transaction)
+    batch_decoder = fastjson.FastDecoder(BatchTransactionRequest)
+
+    @app.post("/detect")
+    async def detect(request: Request):
+        transaction = transaction_decoder.decode(await request.body())
+        record_since_request_start("validate")
+        return FastJSONResponse(await run_in_threadpool(detect_transaction, transaction))
+
+    @app.post("/batchdetect")
+    async def batch_detect(request: Request):
+        batch = batch_decoder.decode(await request.body())
+        record_since_request_start("validate")
+        return FastJSONResponse(await run_in_threadpool(batch_detect_transactions, batch.transactions))
+else:
+    if FAST_JSON:
+        logger.warning("FAST_JSON is set but msgspec is not installed; using pydantic parsing")
+    transaction_decoder = None
+
+    @app.post("/detect")
+    def detect(transaction: Transaction):
+        # Reading and validating the body happen before the endpoint runs
+        record_since_request_start("validate")
+        return detect_transaction(transaction)
+
+    @app.post("/batchdetect")
+    def batch_detect(request: BatchTransactionRequest):
+        record_since_request_start("validate")
+        return batch_detect_transactions(request.transactions)
+
+class NDJSONStreamingResponse(StreamingResponse):
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        # The request body is still being read while verdicts are sent, so don't also
+        # consume receive() to watch for a disconnect as StreamingResponse does
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def ndjson_lines(request: Request):
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+def score_stream_batch(lines, first_line):
+    # Invalid lines get an error verdict in place; the rest are scored and committed together
+    verdicts = [None] * len(lines)
+    transactions = []
+    positions = []
+    with stage("validate"):
+        for position, line in enumerate(lines):
+            try:
+                if transaction_decoder is not None:
+                    transactions.append(transaction_decoder.decode_line(line))
+                else:
+                    transactions.append(Transaction.parse_raw(line))
+                positions.append(position)
+            except ValidationError as e:
+                verdicts[position] = {"line": first_line + position, "error": e.errors()}
+
+    results = check_transactions([to_dict(transaction) for transaction in transactions])
+    with stage("store"):
+        upload_transactions([
+            transaction_row(transaction, result["is_fraud"]) for transaction, result in zip(transactions, results)
+        ])
+    for position, result in zip(positions, results):
+        verdicts[position] = result
+    if transaction_decoder is not None:
+        return b"".join(fastjson.dumps(verdict) + b"\n" for verdict in verdicts)
+    return "".join(json.dumps(verdict) + "\n" for verdict in verdicts)
+
+@app.post("/detect/stream")
+async def detect_stream(request: Request):
+    async def verdicts():
+        start = time.perf_counter()
+        count = 0
+        batch = []
+        async for line in ndjson_lines(request):
+            batch.append(line)
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield await run_in_threadpool(score_stream_batch, batch, count + 1)
+                count += len(batch)
+                batch = []
+        if batch:
+            yield await run_in_threadpool(score_stream_batch, batch, count + 1)
+            count += len(batch)
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Streamed {count} verdicts in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.0f} rows/s)")
+
+    return NDJSONStreamingResponse(verdicts())
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    if CHECKER_WORKERS > 1:
+        uvicorn.run("checker:app", host="127.0.0.1", port=8000, workers=CHECKER_WORKERS)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,384 @@
+import io
+import os
+import glob
+import queue
+import logging
+import threading
+from datetime import datetime, date
+import pandas as pd
+from txlog import read_segment, segment_paths, segment_number, tail_csv, TXLOG_DIR
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# How transaction history is kept: csv, or parquet to compact sealed log segments into Parquet
+HISTORY_FORMAT = os.getenv("HISTORY_FORMAT", "csv").lower()
+# Date-partitioned Parquet history, one date=YYYY-MM-DD directory per day
+HISTORY_PARQUET_DIR = os.getenv("HISTORY_PARQUET_DIR", os.path.join("data", "history"))
+# Snapshot of the newest transactions written by db_connector in parquet mode
+HISTORY_SNAPSHOT_FILE = os.path.join("data", "transaction_history.parquet")
+# Rows per Parquet row group; smaller groups let tail reads skip more of a file
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "65536"))
+
+# Types of the columns utils.process_data requires
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("Transaction_ID", pa.string()),
+        ("Payer_ID", pa.string()),
+        ("Payee_ID", pa.string()),
+        ("Amount", pa.float64()),
+        ("Transaction_Channel", pa.string()),
+        ("Transaction_Payment_Mode", pa.string()),
+        ("Payment_Gateway_Bank", pa.string()),
+        ("is_fraud_predicted", pa.bool_()),
+        ("is_fraud_reported", pa.bool_()),
+        ("Timestamp", pa.timestamp("us"))
+    ])
+
+NO_DATE_PARTITION = "date=unknown"
+# Compacted rows keep the byte offset they had in their CSV segment, so log positions stay valid
+OFFSET_COLUMN = "_offset"
+
+
+def available():
+    return pa is not None
+
+
+def use_parquet():
+    """
+    Returns:
+        bool: True if HISTORY_FORMAT selects Parquet
+
+    Raises:
+        ValueError: If HISTORY_FORMAT is neither csv nor parquet
+        RuntimeError: If Parquet is selected but pyarrow is not installed
+    """
+    if HISTORY_FORMAT == "csv":
+        return False
+    if HISTORY_FORMAT != "parquet":
+        raise ValueError(f"Unknown HISTORY_FORMAT: {HISTORY_FORMAT}")
+    if pa is None:
+        raise RuntimeError("HISTORY_FORMAT=parquet needs pyarrow installed")
+    return True
+
+
+def to_table(df):
+    """
+    Convert transactions to an Arrow table with the typed history schema.
+
+    Columns outside the schema are kept after the schema's columns, with their inferred types.
+
+    Args:
+        df (DataFrame): Transactions with at least the schema's columns
+
+    Returns:
+        pa.Table: The typed table
+    """
+    missing = [name for name in SCHEMA.names if name not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    df = df.copy()
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+    df["Amount"] = pd.to_numeric(df["Amount"])
+    for name in ["is_fraud_predicted", "is_fraud_reported"]:
+        df[name] = df[name].fillna(False).astype(bool)
+    for name in ["Transaction_ID", "Payer_ID", "Payee_ID"]:
+        df[name] = df[name].astype(str)
+    extras = [name for name in df.columns if name not in SCHEMA.names]
+    table = pa.Table.from_pandas(df[SCHEMA.names + extras], preserve_index=False)
+    return table.cast(pa.schema(list(SCHEMA) + [table.schema.field(name) for name in extras]))
+
+
+def _time_filter(start, end):
+    # Timestamp bounds as a dataset expression; end is exclusive
+    timestamp_type = SCHEMA.field("Timestamp").type
+    expression = None
+    if start is not None:
+        expression = ds.field("Timestamp") >= pa.scalar(pd.Timestamp(start).to_pydatetime(), timestamp_type)
+    if end is not None:
+        before_end = ds.field("Timestamp") < pa.scalar(pd.Timestamp(end).to_pydatetime(), timestamp_type)
+        expression = before_end if expression is None else expression & before_end
+    return expression
+
+
+def _as_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.Timestamp(value).date()
+
+
+def write_snapshot(df, path=HISTORY_SNAPSHOT_FILE):
+    """
+    Replace a single-file Parquet snapshot of transactions.
+    """
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(to_table(df), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path=HISTORY_SNAPSHOT_FILE, columns=None, start=None, end=None):
+    """
+    Read a Parquet snapshot, only the given columns and only row groups that can match the time range.
+
+    Returns:
+        DataFrame: The matching rows
+    """
+    return ds.dataset(path, format="parquet").to_table(columns=columns, filter=_time_filter(start, end)).to_pandas()
+
+
+def partition_paths(directory=HISTORY_PARQUET_DIR, start=None, end=None):
+    """
+    Parquet files of the partitions that can hold rows in [start, end).
+
+    Returns:
+        list: File paths, oldest date first
+    """
+    first, last = _as_date(start), _as_date(end)
+    paths = []
+    for partition in sorted(glob.glob(os.path.join(directory, "date=*"))):
+        name = os.path.basename(partition)
+        if name == NO_DATE_PARTITION:
+            if first is None and last is None:
+                paths.extend(sorted(glob.glob(os.path.join(partition, "*.parquet"))))
+            continue
+        day = date.fromisoformat(name[len("date="):])
+        if (first is not None and day < first) or (last is not None and day > last):
+            continue
+        paths.extend(sorted(glob.glob(os.path.join(partition, "*.parquet"))))
+    return paths
+
+
+def _parquet_segment(path):
+    return int(os.path.basename(path).split(".")[0][len("segment-"):])
+
+
+def compact_segment(path, directory=HISTORY_PARQUET_DIR):
+    """
+    Rewrite a sealed log segment as Parquet, one file per day it covers, and delete the CSV.
+
+    File names carry the segment number, so compacting a segment again after
+    a crash replaces its files instead of duplicating rows. Until the CSV is
+    deleted, readers ignore the segment's Parquet files.
+
+    Args:
+        path (str): A sealed segment; never the one being appended to
+        directory (str): Parquet history directory
+    """
+    number = segment_number(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    data = data[:data.rfind(b"\n") + 1]
+    offsets = []
+    position = data.find(b"\n") + 1
+    for line in data[position:].splitlines(keepends=True):
+        offsets.append(position)
+        position += len(line)
+    if offsets:
+        df = pd.read_csv(io.BytesIO(data))
+        table = to_table(df).append_column(OFFSET_COLUMN, pa.array(offsets, pa.int64()))
+        days = pd.to_datetime(df["Timestamp"]).dt.strftime("%Y-%m-%d").fillna("unknown")
+        for day in days.unique():
+            partition = os.path.join(directory, f"date={day}")
+            os.makedirs(partition, exist_ok=True)
+            target = os.path.join(partition, f"segment-{number:010d}.parquet")
+            # Dot-prefixed files are skipped by readers until renamed
+            tmp_path = os.path.join(partition, f".segment-{number:010d}.parquet.tmp")
+            pq.write_table(table.filter(pa.array((days == day).to_numpy())), tmp_path,
+                           row_group_size=PARQUET_ROW_GROUP_SIZE)
+            os.replace(tmp_path, target)
+    os.remove(path)
+    logger.info(f"Compacted {path} into {directory}")
+
+
+def read_history(directory=HISTORY_PARQUET_DIR, log_dir=TXLOG_DIR, columns=None, start=None, end=None):
+    """
+    Read the Parquet history and the log segments not yet compacted, as one typed DataFrame.
+
+    Only the Parquet partitions for days in [start, end) are opened, only the
+    requested columns are decoded, and row groups whose Timestamp statistics
+    fall outside the range are skipped.
+
+    Args:
+        directory (str): Parquet history directory
+        log_dir (str): Transaction log directory
+        columns (list): Columns to return, all schema columns if omitted
+        start: Earliest Timestamp to include
+        end: Timestamp to stop before
+
+    Returns:
+        DataFrame: Matching rows with the schema's types, oldest segment first
+    """
+    for attempt in range(3):
+        try:
+            return _read_history(directory, log_dir, columns, start, end)
+        except FileNotFoundError:
+            # A segment was compacted while it was being read
+            if attempt == 2:
+                raise
+
+
+def _read_history(directory, log_dir, columns, start, end):
+    segments = segment_paths(log_dir)
+    pending = {segment_number(path) for path in segments}
+    files = [path for path in partition_paths(directory, start, end) if _parquet_segment(path) not in pending]
+    names = columns or SCHEMA.names
+
+    tables = []
+    if files:
+        dataset = ds.dataset(files, schema=SCHEMA, format="parquet")
+        tables.append(dataset.to_table(columns=names, filter=_time_filter(start, end)))
+    for path in segments:
+        df = read_segment(path)
+        if df.empty:
+            continue
+        table = to_table(df)
+        expression = _time_filter(start, end)
+        if expression is not None:
+            table = table.filter(expression)
+        tables.append(table.select(names))
+    if not tables:
+        return pd.DataFrame({name: pd.Series(dtype=SCHEMA.field(name).type.to_pandas_dtype()) for name in names})
+    return pa.concat_tables(tables).to_pandas()
+
+
+def parquet_segments(directory=HISTORY_PARQUET_DIR):
+    """
+    Returns:
+        dict: Segment number to the Parquet files it was compacted into
+    """
+    segments = {}
+    for path in sorted(glob.glob(os.path.join(directory, "date=*", "segment-*.parquet"))):
+        segments.setdefault(_parquet_segment(path), []).append(path)
+    return segments
+
+
+def tail_parquet(paths, limit=100, before=None):
+    """
+    Get the last rows of one compacted segment that start before a byte offset.
+
+    Row groups whose offsets are all at or past before are skipped.
+
+    Returns:
+        tuple: (list of row dictionaries, list of their byte offsets), oldest first
+    """
+    dataset = ds.dataset(paths, format="parquet")
+    expression = ds.field(OFFSET_COLUMN) < before if before is not None else None
+    table = dataset.to_table(filter=expression).sort_by(OFFSET_COLUMN)
+    df = table.slice(max(0, table.num_rows - limit)).to_pandas()
+    offsets = df.pop(OFFSET_COLUMN).tolist()
+    # Rows read from the CSV segments have text timestamps
+    df["Timestamp"] = df["Timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df.to_dict(orient="records"), offsets
+
+
+def read_tail(limit=100, before=None, directory=HISTORY_PARQUET_DIR, log_dir=TXLOG_DIR, legacy_file=None):
+    """
+    Read the newest rows of the history, or the rows just older than a position, newest segment first.
+
+    Only the segments the page spans are opened, and within them only the
+    blocks or row groups holding its rows, so the cost depends on the page
+    size and not on how much history there is.
+
+    Args:
+        limit (int): Most rows to return
+        before (tuple): (segment number, byte offset) position; rows from there on are skipped
+        directory (str): Parquet history directory
+        log_dir (str): Transaction log directory
+        legacy_file (str): History CSV written before the log existed, read as segment 0
+
+    Returns:
+        tuple: (list of row dictionaries, list of their positions), oldest first
+    """
+    rows, positions = [], []
+    for attempt in range(3):
+        csv_segments = {segment_number(path): path for path in segment_paths(log_dir)}
+        compacted = parquet_segments(directory)
+        numbers = set(csv_segments) | set(compacted)
+        if legacy_file is not None and os.path.exists(legacy_file):
+            csv_segments[0] = legacy_file
+            numbers.add(0)
+        try:
+            for number in sorted(numbers, reverse=True):
+                if len(rows) >= limit:
+                    break
+                if before is not None and number > before[0]:
+                    continue
+                bound = before[1] if before is not None and number == before[0] else None
+                if number in csv_segments:
+                    page, offsets = tail_csv(csv_segments[number], limit - len(rows), bound)
+                else:
+                    page, offsets = tail_parquet(compacted[number], limit - len(rows), bound)
+                rows = page + rows
+                positions = [(number, offset) for offset in offsets] + positions
+                before = (number, offsets[0]) if offsets else (number, 0)
+            return rows, positions
+        except FileNotFoundError:
+            # The segment was compacted while it was being read; carry on from the same position
+            if attempt == 2:
+                raise
+
+
+class SegmentCompactor:
+    """
+    Compacts sealed transaction log segments into Parquet on a background thread.
+
+    Set submit as the log's on_seal callback so appends never wait for a compaction.
+    """
+
+    def __init__(self, log, directory=HISTORY_PARQUET_DIR):
+        self.log = log
+        self.directory = directory
+        self._queue = queue.Queue()
+        self._thread = None
+
+        # Metrics
+        self.compacted = 0
+        self.failed = 0
+
+    def start(self):
+        """
+        Start the compactor and queue every segment the log has already sealed.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="segment-compactor", daemon=True)
+        self._thread.start()
+        for path in self.log.sealed_segments():
+            self.submit(path)
+
+    def submit(self, path):
+        self._queue.put(path)
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            try:
+                compact_segment(path, self.directory)
+                self.compacted += 1
+            except Exception as e:
+                # The CSV segment is kept and stays readable; it is retried on the next start
+                self.failed += 1
+                logger.error(f"Failed to compact {path}: {e}")
+
+    def stop(self, timeout=None):
+        """
+        Finish the queued compactions and stop the thread.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
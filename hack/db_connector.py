@@ -1,9 +1,10 @@
 import os
-import mysql.connector
 import pandas as pd
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
+from storage import get_storage
+from columnar import use_parquet, write_snapshot, HISTORY_SNAPSHOT_FILE
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -24,25 +25,9 @@ os.makedirs(DATA_DIR, exist_ok=True)
 new_data_available = False
 
 
-def get_db_connection():
-    """
-    Establish a connection to the MySQL database using environment variables.
-    """
-    try:
-        return mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USERNAME"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_DB")
-        )
-    except mysql.connector.Error as e:
-        logger.error(f"Error connecting to MySQL database: {e}")
-        return None
-
-
 def fetch_transactions(limit=1000):
     """
-    Fetch transactions from the MySQL database.
+    Fetch transactions from the configured storage backend.
 
     Args:
         limit (int): Maximum number of transactions to fetch
@@ -51,33 +36,9 @@ def fetch_transactions(limit=1000):
         DataFrame: Pandas DataFrame with transaction data or None if error
     """
     try:
-        conn = get_db_connection()
-        if conn is None:
-            return None
-
-        # Query matches the exact columns from checker.py and transaction structure
-        query = f"""
-        SELECT 
-            transaction_id_anonymous as Transaction_ID,
-            payee_id_anonymous as Payee_ID,
-            payer_email_anonymous as Payer_ID,
-            transaction_amount as Amount,
-            transaction_channel as Transaction_Channel,
-            transaction_payment_mode_anonymous as Transaction_Payment_Mode,
-            payment_gateway_bank_anonymous as Payment_Gateway_Bank,
-            is_fraud as is_fraud_predicted,
-            FALSE as is_fraud_reported,
-            transaction_date as Timestamp,
-            payer_browser_anonymous,
-            payee_ip_anonymous,
-            payer_mobile_anonymous
-        FROM transactions
-        ORDER BY transaction_date DESC
-        LIMIT {limit}
-        """
-
-        df = pd.read_sql(query, conn)
-        conn.close()
+        # Columns match what checker.py stores, see storage.RECENT_TRANSACTIONS_QUERY
+        columns, rows = get_storage().fetch_recent_transactions(limit)
+        df = pd.DataFrame(rows, columns=columns)
 
         # Process data for the dashboard
         if not df.empty:
@@ -90,7 +51,10 @@ def fetch_transactions(limit=1000):
 
             # Save to files for dashboard
             df.to_csv(LATEST_FILE, index=False)
-            df.to_csv(HISTORY_FILE, index=False)
+            if use_parquet():
+                write_snapshot(df, HISTORY_SNAPSHOT_FILE)
+            else:
+                df.to_csv(HISTORY_FILE, index=False)
 
             # Set new data flag
             global new_data_available
@@ -0,0 +1,272 @@
+import os
+import threading
+import time
+import logging
+import mysql.connector
+from mysql.connector.errors import PoolError
+from dotenv import load_dotenv
+from metrics import REGISTRY
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Pool configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Connections idle for longer than this many seconds are pinged before reuse (0 pings on every checkout)
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))
+
+
+class PooledConnection:
+    """
+    A checked-out MySQL connection.
+
+    Behaves like the underlying connection, except that close() hands it back
+    to the pool instead of disconnecting, so existing call sites keep working.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool._release(self._conn)
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    A bounded pool of MySQL connections with health checks and usage metrics.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, healthcheck_idle=DB_POOL_HEALTHCHECK_IDLE,
+                 **connect_kwargs):
+        """
+        Args:
+            size (int): Maximum number of open connections
+            timeout (float): Seconds to wait for a free connection before raising PoolError
+            healthcheck_idle (float): Idle seconds after which a connection is pinged on checkout
+            **connect_kwargs: Arguments passed to mysql.connector.connect
+        """
+        self.size = size
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = []  # (connection, last_used) pairs, most recently used last
+        self._open = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # Metrics
+        self.checkouts = 0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.peak_in_use = 0
+
+    def get_connection(self, timeout=None):
+        """
+        Check out a connection, waiting for one to be returned if the pool is full.
+
+        Args:
+            timeout (float): Seconds to wait, defaults to the pool timeout
+
+        Returns:
+            PooledConnection: A healthy connection; close() returns it to the pool
+
+        Raises:
+            PoolError: If no connection is free within timeout, or the pool has been closed
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            conn, last_used = None, None
+            with self._cond:
+                while not self._closed and not self._idle and self._open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolError(f"No database connection available within {timeout:.1f}s")
+                    self._cond.wait(remaining)
+
+                if self._closed:
+                    raise PoolError("Connection pool has been closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    self._open += 1
+                self._in_use += 1
+
+            if conn is None:
+                try:
+                    conn = mysql.connector.connect(**self.connect_kwargs)
+                except Exception:
+                    self._forget()
+                    raise
+                with self._cond:
+                    self.created += 1
+                    closed = self._closed
+                if closed:
+                    # close_all ran while this connection was being opened
+                    self._forget(conn)
+                    raise PoolError("Connection pool has been closed")
+            elif time.monotonic() - last_used >= self.healthcheck_idle and not self._is_healthy(conn):
+                logger.warning("Discarding unhealthy pooled database connection")
+                self._forget(conn)
+                with self._cond:
+                    self.discarded += 1
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self.checkouts += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+                self.peak_in_use = max(self.peak_in_use, self._in_use)
+            return PooledConnection(self, conn)
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _release(self, conn):
+        try:
+            # Never hand out a connection with someone else's open transaction
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception as e:
+            logger.warning(f"Discarding pooled database connection after failed reset: {e}")
+            self._forget(conn)
+            return
+
+        with self._cond:
+            if not self._closed:
+                self._in_use -= 1
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        # The pool was closed while this connection was checked out
+        self._forget(conn)
+
+    def _forget(self, conn=None):
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._open -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        """
+        Close every idle connection. Checked-out connections are closed when returned.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """
+        Get pool usage metrics.
+
+        Returns:
+            dict: Pool size, connection counts, wait times and utilization
+        """
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "peak_in_use": self.peak_in_use,
+                "utilization": self._in_use / self.size if self.size else 0.0,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "created": self.created,
+                "discarded": self.discarded,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_avg": self.wait_time_total / self.checkouts if self.checkouts else 0.0,
+                "wait_time_max": self.wait_time_max
+            }
+
+    def register_metrics(self, registry):
+        """
+        Export the pool's usage and wait times through a metrics registry.
+        """
+        registry.callback("db_pool_connections", "Open pooled database connections by state", "gauge",
+                          lambda: {(("state", "in_use"),): self._in_use, (("state", "idle"),): len(self._idle)})
+        registry.callback("db_pool_utilization", "Share of the pool's connections checked out", "gauge",
+                          lambda: self._in_use / self.size if self.size else 0.0)
+        registry.callback("db_pool_checkouts_total", "Connections checked out of the pool", "counter",
+                          lambda: self.checkouts)
+        registry.callback("db_pool_timeouts_total", "Checkouts that found no free connection in time", "counter",
+                          lambda: self.timeouts)
+        registry.callback("db_pool_wait_seconds_total", "Time spent waiting for a pooled connection", "counter",
+                          lambda: self.wait_time_total)
+        registry.callback("db_pool_wait_seconds_max", "Longest wait for a pooled connection", "gauge",
+                          lambda: self.wait_time_max)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(**connect_kwargs):
+    """
+    Get the process-wide connection pool, creating it on first use.
+
+    Connection settings default to the DB_* environment variables; keyword
+    arguments override them but only take effect on the first call.
+
+    Returns:
+        ConnectionPool: The shared pool
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                settings = {
+                    "host": os.getenv("DB_HOST"),
+                    "user": os.getenv("DB_USERNAME"),
+                    "password": os.getenv("DB_PASSWORD"),
+                    "database": os.getenv("DB_DB")
+                }
+                settings.update(connect_kwargs)
+                _pool = ConnectionPool(**settings)
+                _pool.register_metrics(REGISTRY)
+                logger.info(f"Created database connection pool with up to {_pool.size} connections")
+    return _pool
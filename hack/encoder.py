@@ -0,0 +1,288 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+import numpy as np
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Frequency-encoded model inputs and the Transaction field each one counts
+COUNT_FEATURES = {
+    "payer_email_encoded": "payer_email",
+    "payer_ip_encoded": "payer_ip",
+    "payee_id_encoded": "payee_id",
+    "payment_gateway_bank_encoded": "payment_gateway_bank",
+    "payer_browser_encoded": "payer_browser"
+}
+
+# One-hot encoded model inputs: column prefix and the Transaction field it encodes
+ONE_HOT_FEATURES = {
+    "transaction_channel_": "transaction_channel",
+    "transaction_payment_mode_anonymous_": "transaction_payment_mode"
+}
+
+# Slot marker for an empty bucket in a count table
+EMPTY = np.uint64(0)
+
+
+def hash_value(value):
+    """
+    Stable 64-bit hash of a field value; never 0, which marks empty slots.
+    """
+    digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+def hash_values(values):
+    """
+    Hash many values at once; missing (None) values hash to 0.
+    """
+    return np.array([hash_value(value) if value is not None else 0 for value in values], dtype=np.uint64)
+
+
+class CountTable:
+    """
+    An open-addressing hash table from hashed field values to training counts.
+
+    Stored as two flat arrays so it can be memory-mapped straight from disk
+    and probed in O(1) without building a dict or DataFrame.
+    """
+
+    def __init__(self, keys, values):
+        self.keys = keys
+        self.values = values
+        self.mask = len(keys) - 1
+
+    @classmethod
+    def build(cls, counts):
+        """
+        Args:
+            counts (dict): Field value to number of occurrences in the training data
+        """
+        capacity = 1
+        while capacity < 2 * max(len(counts), 1):
+            capacity *= 2
+        keys = np.zeros(capacity, dtype=np.uint64)
+        values = np.zeros(capacity, dtype=np.uint32)
+        mask = capacity - 1
+        for value, count in counts.items():
+            key = hash_value(value)
+            slot = key & mask
+            while keys[slot] != EMPTY and keys[slot] != key:
+                slot = (slot + 1) & mask
+            keys[slot] = key
+            values[slot] = count
+        return cls(keys, values)
+
+    @classmethod
+    def load(cls, directory, name):
+        return cls(np.load(os.path.join(directory, f"{name}.keys.npy"), mmap_mode="r"),
+                   np.load(os.path.join(directory, f"{name}.values.npy"), mmap_mode="r"))
+
+    def save(self, directory, name):
+        np.save(os.path.join(directory, f"{name}.keys.npy"), np.asarray(self.keys))
+        np.save(os.path.join(directory, f"{name}.values.npy"), np.asarray(self.values))
+
+    def get(self, value):
+        """
+        Get the training count of a value, 0 if it was never seen.
+        """
+        if value is None:
+            return 0
+        return self.lookup(hash_value(value))
+
+    def lookup(self, key):
+        """
+        Get the training count of an already hashed value.
+        """
+        slot = key & self.mask
+        while True:
+            stored = int(self.keys[slot])
+            if stored == key:
+                return int(self.values[slot])
+            if stored == 0:
+                return 0
+            slot = (slot + 1) & self.mask
+
+    def get_many(self, values):
+        """
+        Look up many values at once, probing all of them in lockstep.
+
+        Returns:
+            ndarray: Counts in the same order as values
+        """
+        return self.lookup_many(hash_values(values))
+
+    def lookup_many(self, keys):
+        """
+        Look up many already hashed values; keys of 0 count as missing.
+        """
+        counts = np.zeros(len(keys), dtype=np.float32)
+        pending = np.flatnonzero(keys != EMPTY)
+        slots = keys[pending] & np.uint64(self.mask)
+        while len(pending):
+            stored = self.keys[slots]
+            hit = stored == keys[pending]
+            counts[pending[hit]] = self.values[slots[hit]]
+            probing = ~hit & (stored != EMPTY)
+            pending, slots = pending[probing], (slots[probing] + np.uint64(1)) & np.uint64(self.mask)
+        return counts
+
+
+def _getter(transaction):
+    # Accept both request dictionaries and checker.Transaction models
+    if isinstance(transaction, dict):
+        return transaction.get
+    return lambda field, default=None: getattr(transaction, field, default)
+
+
+class FeatureEncoder:
+    """
+    The notebook's feature engineering for live transactions.
+
+    Replays the value_counts() frequency encodings, the channel and payment
+    mode one-hot columns and the fitted MinMaxScaler, writing the model input
+    in training column order.
+    """
+
+    def __init__(self, columns, tables, scaler, threshold=None, online=None):
+        """
+        Args:
+            columns (list): Model input columns in training order
+            tables (dict): *_encoded column name to its CountTable
+            scaler (dict): MinMaxScaler columns, scale and min
+            threshold (float): Anomaly threshold saved with the features
+            online (OnlineCounters): Live counts added to the training counts, if set
+        """
+        self.columns = list(columns)
+        self.tables = tables
+        self.scaler = scaler
+        self.threshold = threshold
+        self.online = online
+        self.positions = {column: i for i, column in enumerate(self.columns)}
+        self.count_positions = [
+            (self.positions[column], field, tables[column])
+            for column, field in COUNT_FEATURES.items() if column in self.positions and column in tables
+        ]
+        self.amount_position = self.positions.get("transaction_amount")
+        # MinMaxScaler transform is x * scale + min, applied per scaled column
+        self.scaled_positions = np.array([self.positions[column] for column in scaler["columns"]], dtype=np.intp)
+        self.scale = np.asarray(scaler["scale"], dtype=np.float32)
+        self.min = np.asarray(scaler["min"], dtype=np.float32)
+
+    @property
+    def size(self):
+        return len(self.columns)
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        Build an encoder from the model_features.json dictionary saved by train.ipynb.
+        """
+        tables = {column: CountTable.build(counts) for column, counts in spec["counts"].items()}
+        return cls(spec["columns"], tables, spec["scaler"], spec.get("threshold"))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an encoder saved with save(), or the notebook's JSON spec.
+
+        Args:
+            path (str): Encoder directory, or a .json spec file
+        """
+        if path.endswith(".json"):
+            with open(path) as f:
+                return cls.from_spec(json.load(f))
+
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        tables = {column: CountTable.load(path, column) for column in meta["tables"]}
+        return cls(meta["columns"], tables, meta["scaler"], meta.get("threshold"))
+
+    def save(self, directory):
+        """
+        Save as meta.json plus one pair of memory-mappable .npy arrays per count table.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for column, table in self.tables.items():
+            table.save(directory, column)
+        meta = {"columns": self.columns, "tables": list(self.tables), "scaler": self.scaler,
+                "threshold": self.threshold}
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def _one_hot(self, out, get):
+        for prefix, field in ONE_HOT_FEATURES.items():
+            position = self.positions.get(f"{prefix}{get(field)}")
+            if position is not None:
+                out[position] = 1
+
+    def encode(self, transaction, out=None):
+        """
+        Encode a single transaction.
+
+        Args:
+            transaction (dict or Transaction): The transaction to encode
+            out (ndarray): Row of length size to overwrite in place; allocated if omitted
+
+        Returns:
+            ndarray: The model input row
+        """
+        if out is None:
+            out = np.zeros(self.size, dtype=np.float32)
+        get = _getter(transaction)
+        out[:] = 0
+        if self.amount_position is not None:
+            out[self.amount_position] = get("transaction_amount") or 0
+        for position, field, table in self.count_positions:
+            value = get(field)
+            if value is None:
+                continue
+            # Values unseen during training count as zero occurrences
+            key = hash_value(value)
+            out[position] = table.lookup(key)
+            if self.online is not None:
+                out[position] += self.online.count(field, key)
+        self._one_hot(out, get)
+        out[self.scaled_positions] = out[self.scaled_positions] * self.scale + self.min
+        return out
+
+    def encode_batch(self, transactions, out=None):
+        """
+        Encode many transactions, looking up each count column for the whole batch at once.
+
+        Args:
+            transactions (list): Transactions as dictionaries or Transaction models
+            out (ndarray): Array of shape (len(transactions), size) to overwrite; allocated if omitted
+
+        Returns:
+            ndarray: The model input rows
+        """
+        if out is None:
+            out = np.zeros((len(transactions), self.size), dtype=np.float32)
+        getters = [_getter(transaction) for transaction in transactions]
+        out[:] = 0
+        if self.amount_position is not None:
+            out[:, self.amount_position] = [get("transaction_amount") or 0 for get in getters]
+        for position, field, table in self.count_positions:
+            keys = hash_values([get(field) for get in getters])
+            out[:, position] = table.lookup_many(keys)
+            if self.online is not None:
+                present = keys != EMPTY
+                out[present, position] += self.online.count_many(field, keys[present])
+        for row, get in zip(out, getters):
+            self._one_hot(row, get)
+        out[:, self.scaled_positions] = out[:, self.scaled_positions] * self.scale + self.min
+        return out
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 3:
+        print("Usage: python encoder.py <model_features.json> <output directory>")
+        sys.exit(1)
+    encoder = FeatureEncoder.load(sys.argv[1])
+    encoder.save(sys.argv[2])
+    logger.info(f"Saved {len(encoder.tables)} count tables for {encoder.size} model inputs to {sys.argv[2]}")
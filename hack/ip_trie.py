@@ -0,0 +1,119 @@
+import ipaddress
+
+
+def parse_network(value):
+    """
+    Parse a CIDR range such as 10.0.0.0/16.
+
+    Returns:
+        IPv4Network or IPv6Network: The range, or None if value is not in CIDR notation
+    """
+    if not isinstance(value, str) or "/" not in value:
+        return None
+    try:
+        return ipaddress.ip_network(value.strip(), strict=False)
+    except ValueError:
+        return None
+
+
+class PrefixTrie:
+    """
+    A binary radix tree of IP ranges, one per address family.
+
+    Each node is a [zero child, one child, network] list; a lookup follows
+    the address bits from the most significant one, so it costs at most one
+    step per bit of the longest stored prefix.
+    """
+
+    def __init__(self):
+        self._roots = {4: [None, None, None], 6: [None, None, None]}
+        self._networks = set()
+        self._depth = {4: 0, 6: 0}
+
+    def __len__(self):
+        return len(self._networks)
+
+    def __contains__(self, network):
+        return network in self._networks
+
+    @property
+    def networks(self):
+        return frozenset(self._networks)
+
+    def insert(self, network):
+        if network in self._networks:
+            return
+        node = self._roots[network.version]
+        bits = int(network.network_address)
+        width = network.max_prefixlen
+        for i in range(network.prefixlen):
+            bit = (bits >> (width - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = network
+        self._networks.add(network)
+        self._depth[network.version] = max(self._depth[network.version], network.prefixlen)
+
+    def remove(self, network):
+        if network not in self._networks:
+            return
+        path = [self._roots[network.version]]
+        bits = int(network.network_address)
+        width = network.max_prefixlen
+        for i in range(network.prefixlen):
+            path.append(path[-1][(bits >> (width - 1 - i)) & 1])
+        path[-1][2] = None
+        # Prune nodes left with no children and no range
+        for i in range(network.prefixlen, 0, -1):
+            node = path[i]
+            if node[0] is None and node[1] is None and node[2] is None:
+                path[i - 1][(bits >> (width - i)) & 1] = None
+            else:
+                break
+        self._networks.discard(network)
+        self._depth[network.version] = max(
+            (other.prefixlen for other in self._networks if other.version == network.version), default=0)
+
+    def sync(self, networks):
+        """
+        Update the trie to hold exactly the given ranges, touching only the ones that changed.
+
+        Returns:
+            tuple: (number added, number removed)
+        """
+        networks = set(networks)
+        added = networks - self._networks
+        removed = self._networks - networks
+        for network in removed:
+            self.remove(network)
+        for network in added:
+            self.insert(network)
+        return len(added), len(removed)
+
+    def lookup(self, address):
+        """
+        Find the most specific stored range containing an address.
+
+        Args:
+            address (str or IPv4Address or IPv6Address): The address to look up
+
+        Returns:
+            IPv4Network or IPv6Network: The matching range, or None
+        """
+        if isinstance(address, str):
+            try:
+                address = ipaddress.ip_address(address.strip())
+            except ValueError:
+                return None
+        node = self._roots[address.version]
+        bits = int(address)
+        width = address.max_prefixlen
+        match = node[2]
+        for i in range(self._depth[address.version]):
+            node = node[(bits >> (width - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                match = node[2]
+        return match
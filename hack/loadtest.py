@@ -0,0 +1,365 @@
+import os
+import sys
+import time
+import json
+import logging
+import argparse
+import tempfile
+import threading
+import numpy as np
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CHANNELS = ["W", "M", "G"]
+PAYMENT_MODES = ["Card", "UPI", "NEFT", "Wallet"]
+GATEWAYS = ["HDFC", "ICICI", "SBI", "Axis", "Paytm", "Razorpay"]
+BROWSERS = ["Chrome", "Safari", "Firefox", "Edge", "Opera"]
+CARD_BRANDS = ["Visa", "Mastercard", "RuPay", "Amex"]
+
+# Fraudulent transactions come from this range and are above this amount; seed_rules catches both
+FRAUD_NETWORK = "203.0.113.0/24"
+FRAUD_AMOUNT = 50000
+
+LATENCY_PERCENTILES = [("p50", 50), ("p95", 95), ("p99", 99), ("p999", 99.9)]
+
+
+class TransactionGenerator:
+    """
+    Reproducible synthetic checker.Transaction payloads.
+
+    Emails, IPs and payees are drawn from fixed populations with Zipf-like
+    skew, so a few hot keys account for most traffic the way real customers
+    and merchants do. A fraud_ratio share of transactions is fraudulent:
+    large amounts from a dedicated IP range and a small pool of emails.
+    """
+
+    def __init__(self, seed=42, fraud_ratio=0.05, skew=1.1, emails=50000, ips=20000, payees=2000):
+        self.seed = seed
+        self.fraud_ratio = fraud_ratio
+        self.rng = np.random.default_rng(seed)
+        self.emails = self._population(emails, skew)
+        self.ips = self._population(ips, skew)
+        self.payees = self._population(payees, skew)
+        self.count = 0
+
+    @staticmethod
+    def _population(size, skew):
+        # Cumulative Zipf weights over ranks 1..size, sampled with searchsorted
+        weights = 1.0 / np.arange(1, size + 1) ** skew
+        return np.cumsum(weights / weights.sum())
+
+    def _ranks(self, population, n):
+        return np.minimum(np.searchsorted(population, self.rng.random(n)), len(population) - 1)
+
+    def generate(self, n):
+        """
+        Generate the next n transactions.
+
+        Returns:
+            list: Transaction dictionaries with unique transaction ids
+        """
+        rng = self.rng
+        fraud = rng.random(n) < self.fraud_ratio
+        amounts = np.round(rng.lognormal(6.0, 1.2, n), 2)
+        amounts[fraud] = np.round(rng.uniform(FRAUD_AMOUNT, 10 * FRAUD_AMOUNT, fraud.sum()), 2)
+        emails = self._ranks(self.emails, n)
+        ips = self._ranks(self.ips, n)
+        payees = self._ranks(self.payees, n)
+        fraud_hosts = rng.integers(1, 255, n)
+        channels = rng.integers(0, len(CHANNELS), n)
+        modes = rng.integers(0, len(PAYMENT_MODES), n)
+        gateways = rng.integers(0, len(GATEWAYS), n)
+        browsers = rng.integers(0, len(BROWSERS), n)
+        brands = rng.integers(0, len(CARD_BRANDS), n)
+
+        transactions = []
+        for i in range(n):
+            number = self.count + i
+            if fraud[i]:
+                email = f"fraud{emails[i] % 50}@example.net"
+                ip = f"203.0.113.{fraud_hosts[i]}"
+            else:
+                email = f"user{emails[i]}@example.com"
+                ip = f"10.{ips[i] >> 16 & 255}.{ips[i] >> 8 & 255}.{ips[i] & 255}"
+            transactions.append({
+                "transaction_id": f"LT-{self.seed}-{number}",
+                "transaction_date": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1700000000 + number)),
+                "transaction_amount": float(amounts[i]),
+                "transaction_channel": CHANNELS[channels[i]],
+                "transaction_payment_mode": PAYMENT_MODES[modes[i]],
+                "payment_gateway_bank": GATEWAYS[gateways[i]],
+                "payer_email": email,
+                "payer_mobile": f"9{emails[i]:09d}",
+                "payer_card_brand": CARD_BRANDS[brands[i]],
+                "payer_ip": ip,
+                "payer_browser": BROWSERS[browsers[i]],
+                "payee_id": f"MERCHANT{payees[i]}"
+            })
+        self.count += n
+        return transactions
+
+
+class HTTPClient:
+    """
+    Posts to a running checker.py server, with one keep-alive session per thread.
+    """
+
+    def __init__(self, url):
+        import requests
+        self.url = url.rstrip("/")
+        self._requests = requests
+        self._local = threading.local()
+
+    def post(self, path, payload):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.post(self.url + path, json=payload)
+        return response.status_code, response.json() if response.ok else None
+
+    def close(self):
+        pass
+
+
+class InProcessClient:
+    """
+    Calls checker.app directly through Starlette's TestClient, without a network or a server process.
+    """
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        import checker
+        self._client = TestClient(checker.app)
+        self._client.__enter__()
+
+    def post(self, path, payload):
+        response = self._client.post(path, json=payload)
+        return response.status_code, response.json() if response.status_code == 200 else None
+
+    def close(self):
+        self._client.__exit__(None, None, None)
+
+
+def flagged_count(path, body):
+    if body is None:
+        return 0
+    if path == "/detect":
+        return int(bool(body.get("is_fraud")))
+    return sum(1 for verdict in body.values() if verdict.get("is_fraud"))
+
+
+class LoadTest:
+    """
+    Drives one endpoint at a fixed concurrency (closed loop) or a target request rate (open loop).
+
+    In open-loop mode each request's latency is measured from the time it was
+    scheduled to start, not when a worker picked it up, so a saturated server
+    shows up as growing latency rather than being hidden by a slower send rate.
+    """
+
+    def __init__(self, client, generator, endpoint="detect", batch_size=100):
+        self.client = client
+        self.generator = generator
+        self.path = f"/{endpoint}"
+        self.batch_size = batch_size if endpoint == "batchdetect" else 1
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.statuses = {}
+        self.flagged = 0
+        self.cpu_seconds = 0.0
+
+    def _payload(self):
+        with self._lock:
+            transactions = self.generator.generate(self.batch_size)
+        return transactions[0] if self.path == "/detect" else {"transactions": transactions}
+
+    def _send(self, payload, started):
+        try:
+            status, body = self.client.post(self.path, payload)
+        except Exception as e:
+            logger.debug(f"Request failed: {e}")
+            status, body = "error", None
+        latency = time.perf_counter() - started
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.flagged += flagged_count(self.path, body)
+
+    def run_closed(self, concurrency, duration=None, requests=None):
+        """
+        Keep concurrency requests in flight until duration seconds or requests requests have passed.
+        """
+        deadline = time.perf_counter() + duration if duration else None
+        counter = iter(range(requests)) if requests else None
+
+        def worker():
+            while deadline is None or time.perf_counter() < deadline:
+                if counter is not None:
+                    with self._lock:
+                        if next(counter, None) is None:
+                            return
+                payload = self._payload()
+                self._send(payload, time.perf_counter())
+
+        return self._run_threads([threading.Thread(target=worker) for _ in range(concurrency)])
+
+    def run_open(self, rps, duration=None, requests=None, max_workers=256):
+        """
+        Start requests at a fixed rate of rps per second, up to max_workers in flight.
+        """
+        total = requests if requests else int(rps * duration)
+        start = time.perf_counter()
+        next_index = iter(range(total))
+
+        def worker():
+            while True:
+                with self._lock:
+                    index = next(next_index, None)
+                if index is None:
+                    return
+                scheduled = start + index / rps
+                payload = self._payload()
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self._send(payload, scheduled)
+
+        return self._run_threads([threading.Thread(target=worker) for _ in range(min(max_workers, total))])
+
+    def _run_threads(self, threads):
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.cpu_seconds = time.process_time() - cpu_start
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        """
+        Summarise the run.
+
+        Returns:
+            dict: Throughput, error count, flagged share and latency percentiles in milliseconds
+        """
+        latencies = np.array(self.latencies) * 1000
+        completed = len(latencies)
+        transactions = completed * self.batch_size
+        errors = sum(count for status, count in self.statuses.items() if status != 200)
+        report = {
+            "endpoint": self.path,
+            "requests": completed,
+            "transactions": transactions,
+            "elapsed_s": round(elapsed, 3),
+            "requests_per_s": round(completed / elapsed, 1) if elapsed else 0.0,
+            "transactions_per_s": round(transactions / elapsed, 1) if elapsed else 0.0,
+            # For --in-process runs this includes the server's work, so it measures requests per core
+            "cpu_s": round(self.cpu_seconds, 3),
+            "requests_per_cpu_s": round(completed / self.cpu_seconds, 1) if self.cpu_seconds else 0.0,
+            "errors": errors,
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "flagged_ratio": round(self.flagged / transactions, 4) if transactions else 0.0,
+            "generated_fraud_ratio": self.generator.fraud_ratio
+        }
+        if completed:
+            for name, percentile in LATENCY_PERCENTILES:
+                report[f"{name}_ms"] = round(float(np.percentile(latencies, percentile)), 3)
+            report["max_ms"] = round(float(latencies.max()), 3)
+        return report
+
+
+def seed_rules(storage):
+    """
+    Add rules that catch the generator's fraudulent transactions to an empty rule table.
+    """
+    if storage.fetch_rules():
+        return
+    storage.add_rule("Threshold Value", FRAUD_AMOUNT)
+    storage.add_rule("Blocked IP", FRAUD_NETWORK)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Load test the fraud detection API")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Base URL of a running checker.py, e.g. http://127.0.0.1:8000")
+    target.add_argument("--in-process", action="store_true",
+                        help="Call checker.app in this process instead of over HTTP (the default without --url)")
+    parser.add_argument("--backend", choices=["sqlite", "mysql"], default="sqlite",
+                        help="Storage backend for --in-process runs")
+    parser.add_argument("--sqlite-path", help="SQLite file for --in-process runs; a temporary file by default")
+    parser.add_argument("--fast-json", action="store_true",
+                        help="Enable the msgspec/orjson request path (FAST_JSON) for --in-process runs")
+    parser.add_argument("--endpoint", choices=["detect", "batchdetect"], default="detect")
+    parser.add_argument("--batch-size", type=int, default=100, help="Transactions per /batchdetect request")
+
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, help="Requests kept in flight (closed loop)")
+    load.add_argument("--rps", type=float, help="Target requests per second (open loop)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, help="Number of requests to send instead of a duration")
+    parser.add_argument("--warmup", type=int, default=50, help="Requests sent before measuring")
+
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fraud-ratio", type=float, default=0.05)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of the email, IP and payee draws")
+    parser.add_argument("--no-seed-rules", action="store_true",
+                        help="Don't add threshold and blocked-range rules to an empty --in-process rule table")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args(argv)
+
+    if args.url:
+        client = HTTPClient(args.url)
+    else:
+        # Settings are read when checker and storage are first imported
+        os.environ["STORAGE_BACKEND"] = args.backend
+        os.environ["FAST_JSON"] = "true" if args.fast_json else "false"
+        if args.backend == "sqlite":
+            os.environ["SQLITE_PATH"] = args.sqlite_path or os.path.join(
+                tempfile.mkdtemp(prefix="loadtest-"), "fraud_detection.db")
+        from storage import get_storage
+        if not args.no_seed_rules:
+            seed_rules(get_storage())
+        client = InProcessClient()
+
+    generator = TransactionGenerator(seed=args.seed, fraud_ratio=args.fraud_ratio, skew=args.skew)
+    try:
+        if args.warmup:
+            LoadTest(client, TransactionGenerator(seed=args.seed + 1), args.endpoint, args.batch_size).run_closed(
+                concurrency=1, requests=args.warmup)
+
+        test = LoadTest(client, generator, args.endpoint, args.batch_size)
+        duration = None if args.requests else args.duration
+        if args.rps:
+            elapsed = test.run_open(args.rps, duration=duration, requests=args.requests)
+        else:
+            elapsed = test.run_closed(args.concurrency or 8, duration=duration, requests=args.requests)
+    finally:
+        client.close()
+
+    report = test.report(elapsed)
+    if args.json:
+        print(json.dumps(report))
+        return report
+
+    print(f"{report['endpoint']}: {report['requests']} requests, {report['transactions']} transactions "
+          f"in {report['elapsed_s']}s")
+    print(f"throughput: {report['requests_per_s']} req/s, {report['transactions_per_s']} transactions/s")
+    print(f"cpu: {report['cpu_s']}s, {report['requests_per_cpu_s']} req/CPU-s")
+    print(f"errors: {report['errors']} {report['statuses']}")
+    if report["requests"]:
+        print("latency ms: " + " ".join(
+            f"{name} {report[f'{name}_ms']}" for name, _ in LATENCY_PERCENTILES + [("max", None)]))
+    print(f"flagged: {report['flagged_ratio']:.2%} of transactions "
+          f"(generated fraud ratio {report['generated_fraud_ratio']:.2%})")
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,308 @@
+import time
+import bisect
+import threading
+import contextvars
+
+# Default histogram buckets in seconds, from 100µs to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram that is cheap to update from many threads.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Args:
+            buckets (tuple): Upper bounds of the buckets; values above the last one are counted in +Inf
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def quantile(self, q):
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in.
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: The bucket bound, inf if it falls above the last bucket, or 0.0 if empty
+        """
+        with self._lock:
+            counts, count = list(self._counts), self._count
+        if count == 0:
+            return 0.0
+        target = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            seen += bucket_count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        """
+        Get the cumulative bucket counts, sum and count.
+
+        Returns:
+            dict: buckets as (upper bound, cumulative count) pairs, plus sum and count
+        """
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        cumulative = []
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            seen += bucket_count
+            cumulative.append((bound, seen))
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+    def summary(self):
+        """
+        Get the count, mean and estimated p50/p90/p99.
+        """
+        snapshot = self.snapshot()
+        count = snapshot["count"]
+        return {
+            "count": count,
+            "mean": snapshot["sum"] / count if count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99)
+        }
+
+
+class Counter:
+    """
+    A monotonically increasing count that is cheap to update from many threads.
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    Named counters and histograms, with optional labels, rendered in the Prometheus text format.
+
+    Values owned elsewhere, such as queue depths, are exported through
+    callbacks that are only called when the metrics are rendered.
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help, labels, factory):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is None or key not in family["series"]:
+            with self._lock:
+                family = self._families.setdefault(name, {"type": kind, "help": help, "series": {}})
+                if family["type"] != kind:
+                    raise ValueError(f"Metric {name} is already registered as a {family['type']}")
+                family["series"].setdefault(key, factory())
+        return family["series"][key]
+
+    def counter(self, name, help, **labels):
+        return self._get("counter", name, help, labels, Counter)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        return self._get("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def callback(self, name, help, kind, read):
+        """
+        Export a value computed on demand.
+
+        Args:
+            name (str): Metric name
+            help (str): Description
+            kind (str): gauge or counter
+            read (callable): Returns a number, or a dict of label value tuples to numbers keyed
+                             as ((label, value), ...)
+        """
+        with self._lock:
+            self._families[name] = {"type": kind, "help": help, "read": read}
+
+    def render(self):
+        """
+        Get every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            families = sorted(self._families.items())
+        lines = []
+        for name, family in families:
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            if "read" in family:
+                try:
+                    values = family["read"]()
+                except Exception:
+                    continue
+                if not isinstance(values, dict):
+                    values = {(): values}
+                for labels, value in values.items():
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for labels, metric in sorted(family["series"].items()):
+                if family["type"] == "counter":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(metric.value)}")
+                    continue
+                snapshot = metric.snapshot()
+                for bound, count in snapshot["buckets"]:
+                    bucket_labels = labels + (("le", _format_value(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = "fraud_stage_duration_seconds"
+STAGE_HELP = "Time spent in each stage of fraud detection"
+
+# Timings of the request being handled, set by ServerTimingMiddleware
+_request_timing = contextvars.ContextVar("request_timing", default=None)
+# Stage name to its histogram, so timing a stage skips the registry lookup
+_stage_histograms = {}
+
+
+class RequestTiming:
+    """
+    Stage durations of one request, reported back in its Server-Timing header.
+    """
+
+    __slots__ = ("start", "stages")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = []
+
+    def header(self):
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.3f}")
+        return ", ".join(entries)
+
+
+def record_stage(name, seconds):
+    """
+    Record time spent in a stage in its histogram and, if handling a request, its Server-Timing header.
+    """
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        histogram = _stage_histograms[name] = REGISTRY.histogram(STAGE_SECONDS, STAGE_HELP, stage=name)
+    histogram.observe(seconds)
+    timing = _request_timing.get()
+    if timing is not None:
+        timing.stages.append((name, seconds))
+
+
+def record_since_request_start(name):
+    """
+    Record the time from the start of the current request until now as a stage.
+
+    Used for work done before the endpoint runs, like reading and validating the body.
+    """
+    timing = _request_timing.get()
+    if timing is not None:
+        record_stage(name, time.perf_counter() - timing.start)
+
+
+class stage:
+    """
+    Time a block of code as a named stage.
+
+        with stage("rules"):
+            result = index.check(transaction)
+    """
+
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.name, time.perf_counter() - self._start)
+        return False
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that times each request, counts responses by route and
+    status, and adds a Server-Timing header listing the stages recorded while
+    the response was being produced.
+    """
+
+    def __init__(self, app, registry=REGISTRY):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _request_timing.set(timing)
+        status = {}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.header().encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timing.reset(token)
+            # Routes rather than raw paths keep the label set bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.registry.histogram("http_request_duration_seconds", "Time to handle HTTP requests",
+                                    route=route).observe(time.perf_counter() - timing.start)
+            self.registry.counter("http_requests_total", "HTTP responses sent", route=route,
+                                  status=status.get("code", 500)).inc()
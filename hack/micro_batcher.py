@@ -0,0 +1,130 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from metrics import REGISTRY
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Buckets for the number of items per batch
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches for one call of a batch function.
+
+    A batch is dispatched once it holds max_batch_size items or max_wait
+    seconds after its first item arrived, whichever comes first.
+    """
+
+    def __init__(self, process, max_batch_size=64, max_wait=0.002, name="micro-batcher", registry=REGISTRY):
+        """
+        Args:
+            process (callable): Takes a list of items and returns a list of results in the same order
+            max_batch_size (int): Maximum number of items per call
+            max_wait (float): Maximum seconds the first item of a batch waits for others
+            name (str): Name of the worker thread, and the batcher label of its metrics
+            registry (Registry): Where the batch size and queue delay histograms are exported
+        """
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        # Metrics
+        self.batch_sizes = registry.histogram("micro_batch_size", "Items per micro-batch",
+                                              buckets=BATCH_SIZE_BUCKETS, batcher=name)
+        self.queue_delays = registry.histogram("micro_batch_queue_delay_seconds",
+                                               "Time items wait before their micro-batch starts", batcher=name)
+
+    def start(self):
+        """
+        Start the worker thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the worker thread after finishing the items already submitted.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stopping.is_set()
+
+    def submit(self, item):
+        """
+        Queue an item for the next batch.
+
+        Returns:
+            Future: Resolved with the item's result once its batch has been processed
+        """
+        future = Future()
+        self._queue.put((time.monotonic(), item, future))
+        return future
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = batch[0][0] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._stopping.is_set():
+                    break
+                continue
+
+            started = time.monotonic()
+            self.batch_sizes.observe(len(batch))
+            for submitted, _, _ in batch:
+                self.queue_delays.observe(started - submitted)
+
+            try:
+                results = self.process([item for _, item, _ in batch])
+            except Exception as e:
+                logger.error(f"{self.name} failed to process a batch of {len(batch)}: {e}")
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """
+        Get the batch size and queueing delay distributions.
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait": self.max_wait,
+            "queued": self._queue.qsize(),
+            "batch_size": self.batch_sizes.summary(),
+            "queue_delay": self.queue_delays.summary()
+        }
@@ -0,0 +1,8 @@
+-- Velocity rules: more than velocity_max_count transactions, or more than
+-- velocity_max_amount in total, from one velocity_key value within
+-- velocity_window_minutes. velocity_key is payer_email, payee_id or payer_ip.
+ALTER TABLE fraud_rules
+    ADD COLUMN velocity_key VARCHAR(32) NULL,
+    ADD COLUMN velocity_window_minutes INT NULL,
+    ADD COLUMN velocity_max_count INT NULL,
+    ADD COLUMN velocity_max_amount DECIMAL(12, 2) NULL;
@@ -0,0 +1,4 @@
+-- Expression rules: a boolean expression over transaction fields such as
+-- amount > 5000 and channel == "Mobile". See rule_expr.py for the grammar.
+ALTER TABLE fraud_rules
+    ADD COLUMN expression VARCHAR(1000) NULL;
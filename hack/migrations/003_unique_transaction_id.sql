@@ -0,0 +1,5 @@
+-- One row per transaction_id, so /detect retries that reach the database are
+-- dropped by INSERT IGNORE instead of stored twice. Existing duplicate rows
+-- must be removed before this key can be added.
+ALTER TABLE transactions
+    ADD UNIQUE KEY uq_transactions_transaction_id (transaction_id_anonymous);
@@ -0,0 +1,7 @@
+-- Rule revision: bumped by the trigger on every UPDATE of a rule, so the
+-- checker's rules fingerprint also changes when a rule is edited in place,
+-- not only when rules are added or deleted.
+ALTER TABLE fraud_rules
+    ADD COLUMN revision INT NOT NULL DEFAULT 0;
+CREATE TRIGGER fraud_rules_revision BEFORE UPDATE ON fraud_rules
+    FOR EACH ROW SET NEW.revision = OLD.revision + 1;
@@ -0,0 +1,141 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import numpy as np
+from numpy_model import NumpyAutoencoder, reconstruction_error
+from encoder import FeatureEncoder
+from online_counts import OnlineCounters
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Model artifacts. model_best.npz (exported by numpy_model.py) is scored without TensorFlow;
+# point MODEL_PATH at the Keras archive, shipped as model_best.keras.zip, to use Keras instead
+MODEL_PATH = os.getenv("MODEL_PATH", "model_best.npz")
+# Encoder directory written by encoder.py, or the notebook's model_features.json. Neither is
+# committed, since both hold counts taken from the training data. To produce them, run train.ipynb
+# through its "Save the feature engineering" cell, which writes model_features.json to its
+# checkpoint directory, then run: python encoder.py model_features.json model_features
+MODEL_FEATURES_PATH = os.getenv("MODEL_FEATURES_PATH", "model_features")
+MODEL_THRESHOLD = os.getenv("MODEL_THRESHOLD")
+# Add live frequency counts from scored traffic to the notebook's training counts
+ONLINE_COUNTS = os.getenv("ONLINE_COUNTS", "true").lower() in ("1", "true", "yes")
+
+class AutoencoderScorer:
+    """
+    Scores transactions by the autoencoder's reconstruction error.
+
+    The model is loaded once; each thread reuses its own input buffer so no
+    arrays are allocated per request.
+    """
+
+    def __init__(self, model, encoder, threshold):
+        self.model = model
+        self.encoder = encoder
+        self.threshold = float(threshold)
+        self._local = threading.local()
+
+    def _buffer(self, rows):
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape[0] < rows:
+            buffer = np.zeros((rows, self.encoder.size), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer[:rows]
+
+    @property
+    def online(self):
+        return self.encoder.online
+
+    def score(self, transaction: dict):
+        """
+        Get the reconstruction RMSE of a single transaction.
+        """
+        if self.online is not None:
+            self.online.update(transaction)
+        inputs = self._buffer(1)
+        self.encoder.encode(transaction, inputs[0])
+        return float(reconstruction_error(self.model, inputs)[0])
+
+    def score_batch(self, transactions):
+        """
+        Get the reconstruction RMSE of many transactions with one forward pass.
+        """
+        if not transactions:
+            return np.zeros(0, dtype=np.float32)
+        if self.online is not None:
+            for transaction in transactions:
+                self.online.update(transaction)
+        inputs = self.encoder.encode_batch(transactions, self._buffer(len(transactions)))
+        return reconstruction_error(self.model, inputs)
+
+    def annotate(self, result: dict, score):
+        """
+        Merge a model score into a rule detection result.
+
+        Args:
+            result (dict): Result from RuleIndex.check, updated in place
+            score (float): Reconstruction RMSE of the transaction
+
+        Returns:
+            dict: The updated result
+        """
+        score = float(score)
+        result["anomaly_score"] = score
+        if score > self.threshold:
+            result["fraud_reasons"].append(f"Model anomaly score {score:.4f} > {self.threshold:.4f}")
+            result["fraud_source"] = "rule+model" if result["is_fraud"] else "model"
+            result["is_fraud"] = True
+        return result
+
+
+def load_keras_model(path):
+    """
+    Load the Keras model, accepting the .keras archive under any file name.
+    """
+    from tensorflow.keras.models import load_model as load_keras_archive
+
+    if path.endswith(".keras"):
+        return load_keras_archive(path)
+    # Keras only opens archives named *.keras; model_best.keras.zip is one under another name
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, "model.keras")
+        shutil.copyfile(path, archive)
+        return load_keras_archive(archive)
+
+
+def load_model(path):
+    """
+    Load the autoencoder, as NumPy weights for .npz files and with Keras otherwise.
+    """
+    if path.endswith(".npz"):
+        return NumpyAutoencoder.load(path)
+    return load_keras_model(path)
+
+
+def load_scorer(model_path=MODEL_PATH, features_path=MODEL_FEATURES_PATH):
+    """
+    Load the autoencoder and its feature encoder.
+
+    Returns:
+        AutoencoderScorer: The scorer, or None if the artifacts are missing or invalid
+    """
+    try:
+        encoder = FeatureEncoder.load(features_path)
+        threshold = encoder.threshold
+        if MODEL_THRESHOLD is not None:
+            threshold = MODEL_THRESHOLD
+        if threshold is None:
+            raise ValueError(f"No anomaly threshold in {features_path} and MODEL_THRESHOLD is not set")
+        model = load_model(model_path)
+        if ONLINE_COUNTS:
+            encoder.online = OnlineCounters()
+            encoder.online.start()
+    except Exception as e:
+        logger.error(f"Error loading fraud model, continuing with rules only: {e}")
+        return None
+
+    logger.info(f"Loaded fraud model from {model_path} with threshold {float(threshold):.4f}")
+    return AutoencoderScorer(model, encoder, threshold)
+
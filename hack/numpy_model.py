@@ -0,0 +1,148 @@
+import sys
+import logging
+import numpy as np
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": _sigmoid,
+    "tanh": np.tanh
+}
+
+
+def _activation(name):
+    # LeakyReLU is stored as "leaky_relu:<negative slope>"
+    if name.startswith("leaky_relu:"):
+        slope = np.float32(name.split(":", 1)[1])
+        return lambda x: np.where(x > 0, x, x * slope)
+    return ACTIVATIONS[name]
+
+
+class NumpyAutoencoder:
+    """
+    The autoencoder's forward pass as plain NumPy matrix multiplications.
+
+    BatchNormalization is folded into the preceding Dense weights and Dropout
+    is a no-op at inference, so each layer is x @ W + b followed by its
+    activation. Exposes predict_on_batch so it can stand in for the Keras model.
+    """
+
+    def __init__(self, layers):
+        """
+        Args:
+            layers (list): (weights, bias, activation name) per Dense layer
+        """
+        self.layers = [
+            (np.ascontiguousarray(weights, dtype=np.float32), np.asarray(bias, dtype=np.float32), activation)
+            for weights, bias, activation in layers
+        ]
+        self._activations = [_activation(activation) for _, _, activation in self.layers]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            activations = [str(activation) for activation in data["activations"]]
+            layers = [(data[f"weights_{i}"], data[f"bias_{i}"], activation) for i, activation in enumerate(activations)]
+        return cls(layers)
+
+    def save(self, path):
+        arrays = {"activations": np.array([activation for _, _, activation in self.layers])}
+        for i, (weights, bias, _) in enumerate(self.layers):
+            arrays[f"weights_{i}"] = weights
+            arrays[f"bias_{i}"] = bias
+        np.savez_compressed(path, **arrays)
+
+    @property
+    def input_size(self):
+        return self.layers[0][0].shape[0]
+
+    def predict_on_batch(self, inputs):
+        x = np.asarray(inputs, dtype=np.float32)
+        for (weights, bias, _), activation in zip(self.layers, self._activations):
+            x = activation(x @ weights + bias)
+        return x
+
+    @classmethod
+    def from_keras(cls, model):
+        """
+        Convert a Sequential model of Dense, BatchNormalization, LeakyReLU and Dropout layers.
+
+        Args:
+            model: The loaded Keras model
+
+        Returns:
+            NumpyAutoencoder: The equivalent NumPy model
+        """
+        layers = []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            if kind == "Dense":
+                weights, bias = layer.get_weights()
+                layers.append([weights, bias, layer.get_config()["activation"]])
+            elif kind == "BatchNormalization":
+                if not layers or layers[-1][2] != "linear":
+                    raise ValueError(f"Cannot fold {layer.name}: it must directly follow a linear Dense layer")
+                gamma, beta, mean, variance = layer.get_weights()
+                factor = gamma / np.sqrt(variance + layer.epsilon)
+                layers[-1][0] = layers[-1][0] * factor
+                layers[-1][1] = (layers[-1][1] - mean) * factor + beta
+            elif kind == "LeakyReLU":
+                config = layer.get_config()
+                # Keras 3 calls the slope negative_slope, Keras 2 called it alpha
+                slope = config.get("negative_slope", config.get("alpha"))
+                layers[-1][2] = f"leaky_relu:{slope}"
+            elif kind in ("Dropout", "InputLayer"):
+                continue
+            else:
+                raise ValueError(f"Unsupported layer type for NumPy export: {kind}")
+        return cls([tuple(layer) for layer in layers])
+
+
+def reconstruction_error(model, inputs):
+    reconstructed = np.asarray(model.predict_on_batch(inputs))
+    return np.sqrt(np.mean((inputs - reconstructed) ** 2, axis=1))
+
+
+def export(keras_path, npz_path, samples=1000, tolerance=1e-4):
+    """
+    Export a Keras autoencoder to .npz and check it against model.predict.
+
+    Args:
+        keras_path (str): Path to the .keras archive
+        npz_path (str): Output path for the NumPy weights
+        samples (int): Number of random MinMax-scaled inputs to compare on
+        tolerance (float): Maximum allowed absolute RMSE difference
+
+    Returns:
+        float: The largest absolute RMSE difference observed
+    """
+    from model_scorer import load_keras_model
+
+    keras_model = load_keras_model(keras_path)
+    numpy_model = NumpyAutoencoder.from_keras(keras_model)
+
+    inputs = np.random.default_rng(42).random((samples, numpy_model.input_size), dtype=np.float32)
+    expected = np.sqrt(np.mean((inputs - keras_model.predict(inputs, verbose=0)) ** 2, axis=1))
+    difference = float(np.max(np.abs(reconstruction_error(numpy_model, inputs) - expected)))
+    if difference > tolerance:
+        raise ValueError(f"NumPy model RMSE differs from Keras by {difference:.2e} (tolerance {tolerance:.0e})")
+
+    numpy_model.save(npz_path)
+    logger.info(f"Exported {len(numpy_model.layers)} layers to {npz_path}, max RMSE difference {difference:.2e}")
+    return difference
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 3:
+        print("Usage: python numpy_model.py <model.keras> <model.npz>")
+        sys.exit(1)
+    export(sys.argv[1], sys.argv[2])
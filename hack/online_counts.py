@@ -0,0 +1,276 @@
+import os
+import math
+import time
+import logging
+import tempfile
+import itertools
+import threading
+import numpy as np
+from encoder import COUNT_FEATURES, hash_value
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process uses ONLINE_COUNTS_PATH
+    fcntl = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Sketch dimensions: memory per counted field is depth * width * 8 bytes
+ONLINE_COUNTS_WIDTH = int(os.getenv("ONLINE_COUNTS_WIDTH", "65536"))
+ONLINE_COUNTS_DEPTH = int(os.getenv("ONLINE_COUNTS_DEPTH", "4"))
+# Seconds for a count to decay to half its weight (0 disables decay)
+ONLINE_COUNTS_HALF_LIFE = float(os.getenv("ONLINE_COUNTS_HALF_LIFE", str(7 * 24 * 3600)))
+# Values whose estimate reaches this count are tracked exactly, up to ONLINE_COUNTS_HEAVY_CAPACITY per field
+ONLINE_COUNTS_HEAVY_THRESHOLD = float(os.getenv("ONLINE_COUNTS_HEAVY_THRESHOLD", "100"))
+ONLINE_COUNTS_HEAVY_CAPACITY = int(os.getenv("ONLINE_COUNTS_HEAVY_CAPACITY", "10000"))
+ONLINE_COUNTS_PATH = os.getenv("ONLINE_COUNTS_PATH", "online_counts.npz")
+ONLINE_COUNTS_CHECKPOINT_INTERVAL = float(os.getenv("ONLINE_COUNTS_CHECKPOINT_INTERVAL", "60"))
+
+# Rescale stored weights before they grow past this factor
+MAX_LOG_WEIGHT = 40.0
+
+
+class CountMinSketch:
+    """
+    Approximate counts in fixed memory, with exact counts for heavy hitters.
+
+    Estimates never undercount. Decay is applied lazily: each update is stored
+    with weight e^(rate * (t - origin)) and estimates are divided by the
+    current weight, so aging every counter costs nothing per update.
+    """
+
+    def __init__(self, width=ONLINE_COUNTS_WIDTH, depth=ONLINE_COUNTS_DEPTH, half_life=ONLINE_COUNTS_HALF_LIFE,
+                 heavy_threshold=ONLINE_COUNTS_HEAVY_THRESHOLD, heavy_capacity=ONLINE_COUNTS_HEAVY_CAPACITY):
+        self.width = width
+        self.depth = depth
+        self.rate = math.log(2) / half_life if half_life > 0 else 0.0
+        self.heavy_threshold = heavy_threshold
+        self.heavy_capacity = heavy_capacity
+        self.table = np.zeros((depth, width), dtype=np.float64)
+        self.heavy = {}
+        self.origin = time.time()
+        self._rows = np.arange(depth)
+
+    def _columns(self, key):
+        # Double hashing: row i uses h1 + i * h2, both taken from the one 64-bit key
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def _log_weight(self, now):
+        return self.rate * (now - self.origin)
+
+    def _rescale(self, now):
+        factor = math.exp(-self._log_weight(now))
+        self.table *= factor
+        for key in self.heavy:
+            self.heavy[key] *= factor
+        self.origin = now
+
+    def add(self, key, now=None):
+        """
+        Count one occurrence of a hashed value.
+        """
+        now = time.time() if now is None else now
+        log_weight = self._log_weight(now)
+        if log_weight > MAX_LOG_WEIGHT:
+            self._rescale(now)
+            log_weight = 0.0
+        weight = math.exp(log_weight)
+
+        if key in self.heavy:
+            self.heavy[key] += weight
+            return
+
+        columns = self._columns(key)
+        self.table[self._rows, columns] += weight
+        if len(self.heavy) < self.heavy_capacity:
+            estimate = self.table[self._rows, columns].min()
+            if estimate >= self.heavy_threshold * weight:
+                self.heavy[key] = estimate
+
+    def estimate(self, key, now=None):
+        """
+        Get the decayed count of a hashed value.
+        """
+        now = time.time() if now is None else now
+        stored = self.heavy.get(key)
+        if stored is None:
+            stored = self.table[self._rows, self._columns(key)].min()
+        return float(stored) / math.exp(self._log_weight(now))
+
+    def estimate_many(self, keys, now=None):
+        """
+        Get the decayed counts of many hashed values.
+
+        Returns:
+            ndarray: Counts in the same order as keys
+        """
+        now = time.time() if now is None else now
+        keys = np.asarray(keys, dtype=np.uint64)
+        h1 = (keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        h2 = ((keys >> np.uint64(32)) | np.uint64(1)).astype(np.int64)
+        columns = (h1[None, :] + self._rows[:, None] * h2[None, :]) % self.width
+        stored = self.table[self._rows[:, None], columns].min(axis=0)
+        for i, key in enumerate(keys.tolist()):
+            if key in self.heavy:
+                stored[i] = self.heavy[key]
+        return stored / math.exp(self._log_weight(now))
+
+    def state(self):
+        heavy_keys = np.fromiter(self.heavy.keys(), dtype=np.uint64, count=len(self.heavy))
+        heavy_counts = np.fromiter(self.heavy.values(), dtype=np.float64, count=len(self.heavy))
+        return {"table": self.table, "heavy_keys": heavy_keys, "heavy_counts": heavy_counts,
+                "origin": np.float64(self.origin)}
+
+    def restore(self, table, heavy_keys, heavy_counts, origin):
+        if table.shape != self.table.shape:
+            raise ValueError(f"Checkpoint sketch shape {table.shape} does not match {self.table.shape}")
+        self.table = np.array(table, dtype=np.float64)
+        self.heavy = dict(zip(heavy_keys.tolist(), heavy_counts.tolist()))
+        self.origin = float(origin)
+
+
+class OnlineCounters:
+    """
+    Live frequency counts for the fields behind the model's *_encoded inputs.
+
+    Updated with every scored transaction and checkpointed to disk
+    periodically so counts survive restarts.
+
+    Each checker worker counts its own share of the traffic, so each one
+    claims a checkpoint slot with an flock: the first process uses path
+    itself, the next ones <path>.1.npz, <path>.2.npz and so on. After a
+    restart the workers claim the same slots again and pick up their own
+    counts, and no worker ever overwrites another's checkpoint.
+    """
+
+    def __init__(self, fields=tuple(COUNT_FEATURES.values()), path=ONLINE_COUNTS_PATH,
+                 checkpoint_interval=ONLINE_COUNTS_CHECKPOINT_INTERVAL, **sketch_kwargs):
+        self.fields = tuple(fields)
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.sketches = {field: CountMinSketch(**sketch_kwargs) for field in self.fields}
+        self.updates = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._slot_fd = None
+
+    def update(self, transaction: dict):
+        """
+        Count the field values of one transaction.
+        """
+        now = time.time()
+        keys = [(field, transaction.get(field)) for field in self.fields]
+        keys = [(field, hash_value(value)) for field, value in keys if value is not None]
+        with self._lock:
+            for field, key in keys:
+                self.sketches[field].add(key, now)
+            self.updates += 1
+
+    def count(self, field, key):
+        """
+        Get the live count of a hashed value of a field.
+        """
+        with self._lock:
+            return self.sketches[field].estimate(key)
+
+    def count_many(self, field, keys):
+        with self._lock:
+            return self.sketches[field].estimate_many(keys)
+
+    def checkpoint(self):
+        """
+        Atomically write all sketches to the checkpoint file.
+        """
+        with self._lock:
+            arrays = {}
+            for field, sketch in self.sketches.items():
+                for name, value in sketch.state().items():
+                    arrays[f"{field}.{name}"] = np.copy(value)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(self.path)}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def claim_slot(self):
+        """
+        Lock a checkpoint file no other running process is using, and checkpoint to it from now on.
+
+        Returns:
+            str: The claimed checkpoint path
+        """
+        if fcntl is None or self._slot_fd is not None:
+            return self.path
+        base, extension = os.path.splitext(self.path)
+        for slot in itertools.count():
+            path = self.path if slot == 0 else f"{base}.{slot}{extension}"
+            fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            self._slot_fd = fd
+            self.path = path
+            return path
+
+    def restore(self):
+        """
+        Load the checkpoint file if there is one.
+
+        Returns:
+            bool: True if counts were restored
+        """
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                with self._lock:
+                    for field, sketch in self.sketches.items():
+                        if f"{field}.table" in data:
+                            sketch.restore(data[f"{field}.table"], data[f"{field}.heavy_keys"],
+                                           data[f"{field}.heavy_counts"], data[f"{field}.origin"])
+        except Exception as e:
+            logger.error(f"Error restoring online counts from {self.path}: {e}")
+            return False
+        logger.info(f"Restored online counts from {self.path}")
+        return True
+
+    def start(self):
+        """
+        Claim a checkpoint slot, restore its last checkpoint and start checkpointing in the background.
+        """
+        self.claim_slot()
+        self.restore()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="online-counts-checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the checkpoint thread and write a final checkpoint.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.checkpoint()
+        if self._slot_fd is not None:
+            os.close(self._slot_fd)
+            self._slot_fd = None
+
+    def _run(self):
+        while not self._stop.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.error(f"Error checkpointing online counts: {e}")
@@ -0,0 +1,73 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# Most verdicts kept, and seconds each one stays valid for retries
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "100000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+
+
+class ResultCache:
+    """
+    Recent detection verdicts keyed by transaction_id.
+
+    Least recently used entries are evicted once capacity is reached and
+    entries older than ttl seconds are treated as misses, so a retried
+    request gets back exactly the verdict of its first attempt.
+    """
+
+    def __init__(self, capacity=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Get the cached verdict for a transaction_id.
+
+        Returns:
+            dict: The verdict, or None if it is not cached or has expired
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
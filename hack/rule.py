@@ -1,66 +1,21 @@
 import streamlit as st
-import mysql.connector
 import pandas as pd
-import os,dotenv
+import dotenv
+from storage import get_storage
+from rule_expr import Expression, ExpressionError
 
 dotenv.load_dotenv()
 
 st.set_page_config(page_title="Fraud Detection Rule Engine", layout="wide")
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USERNAME"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_DB")
-    )
-
 def fetch_rules():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM fraud_rules WHERE is_active = 1")
-    rules = cursor.fetchall()
-    conn.close()
-    return pd.DataFrame(rules)
+    return pd.DataFrame(get_storage().fetch_rules())
 
 def add_rule(rule_type, value):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    if rule_type == "Threshold Value":
-        cursor.execute(
-            """INSERT INTO fraud_rules (rule_type, threshold) 
-            VALUES (%s, %s)""", (rule_type, value)
-        )
-    elif rule_type == "Blocked IP":
-        cursor.execute(
-            """INSERT INTO fraud_rules (rule_type, blocked_ip) 
-            VALUES (%s, %s)""", (rule_type, value)
-        )
-    elif rule_type == "Blocked Payment Gateway":
-        cursor.execute(
-            """INSERT INTO fraud_rules (rule_type, blocked_payment_gateway) 
-            VALUES (%s, %s)""", (rule_type, value)
-        )
-    elif rule_type == "Blocked Browser":
-        cursor.execute(
-            """INSERT INTO fraud_rules (rule_type, blocked_payer_browser) 
-            VALUES (%s, %s)""", (rule_type, value)
-        )
-    elif rule_type == "Blocked Email":
-        cursor.execute(
-            """INSERT INTO fraud_rules (rule_type, blocked_email) 
-            VALUES (%s, %s)""", (rule_type, value)
-        )
-    conn.commit()
-    conn.close()
+    get_storage().add_rule(rule_type, value)
 
 def delete_rule(rule_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM fraud_rules WHERE id = %s", (rule_id,))
-    conn.commit()
-    conn.close()
+    get_storage().delete_rule(rule_id)
 
 st.markdown("<h1>Fraud Detection Rule Engine</h1>", unsafe_allow_html=True)
 
@@ -70,20 +25,38 @@ st.dataframe(rules_df, height=300)
 
 st.subheader("Manage Rules")
 with st.expander("Add New Rule"):
-    rule_type = st.selectbox("Rule Type", ["Threshold Value", "Blocked IP", "Blocked Payment Gateway", "Blocked Email", "Blocked Browser"])
+    rule_type = st.selectbox("Rule Type", ["Threshold Value", "Blocked IP", "Blocked Payment Gateway", "Blocked Email", "Blocked Browser", "Velocity", "Expression"])
     if rule_type == "Threshold Value":
         value = st.number_input("Enter Maximum Threshold Value", min_value=0.0)
     elif rule_type == "Blocked IP":
-        value = st.text_input("Enter IP Address to Block")
+        value = st.text_input("Enter IP Address or CIDR Range (e.g. 10.0.0.0/16) to Block")
     elif rule_type == "Blocked Payment Gateway":
         value = st.text_input("Enter Payment Gateway to Block")
     elif rule_type == "Blocked Email":
         value = st.text_input("Enter Email Address to Block")
     elif rule_type == "Blocked Browser":
         value = st.text_input("Enter Browser to Block")
+    elif rule_type == "Velocity":
+        # A limit of 0 leaves that limit unset
+        value = {
+            "key": st.selectbox("Count Transactions By", ["payer_email", "payee_id", "payer_ip"]),
+            "window_minutes": st.number_input("Window (minutes)", min_value=1, value=10, step=1),
+            "max_count": st.number_input("Maximum Transactions in Window", min_value=0, step=1) or None,
+            "max_amount": st.number_input("Maximum Total Amount in Window", min_value=0.0) or None
+        }
+    elif rule_type == "Expression":
+        value = st.text_input("Enter Rule Expression", placeholder='amount > 5000 and channel == "Mobile"')
     if st.button("Add Rule"):
-        add_rule(rule_type, value)
-        st.success("Rule Added Successfully!")
+        try:
+            if rule_type == "Expression":
+                Expression(value)
+            if rule_type == "Velocity" and value["max_count"] is None and value["max_amount"] is None:
+                st.error("Set a maximum transaction count or total amount for the velocity rule")
+            else:
+                add_rule(rule_type, value)
+                st.success("Rule Added Successfully!")
+        except ExpressionError as e:
+            st.error(f"Invalid expression: {e}")
 
 st.subheader("Delete Rule")
 with st.expander("Delete Rule"):
@@ -0,0 +1,354 @@
+import re
+import ast
+import operator
+import numpy as np
+import pandas as pd
+
+# Short names usable in expressions for Transaction fields; the full field names work too
+FIELD_ALIASES = {
+    "id": "transaction_id",
+    "date": "transaction_date",
+    "amount": "transaction_amount",
+    "channel": "transaction_channel",
+    "payment_mode": "transaction_payment_mode",
+    "gateway": "payment_gateway_bank",
+    "email": "payer_email",
+    "mobile": "payer_mobile",
+    "card_brand": "payer_card_brand",
+    "ip": "payer_ip",
+    "browser": "payer_browser",
+    "payee": "payee_id"
+}
+NUMERIC_FIELDS = {"transaction_amount"}
+STRING_FIELDS = {field for field in FIELD_ALIASES.values() if field not in NUMERIC_FIELDS}
+
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge
+}
+STRING_TESTS = ("contains", "startswith", "endswith")
+KEYWORDS = {"and", "or", "not", "in"} | set(STRING_TESTS)
+
+# Relative cost of one predicate; the operands of and/or are evaluated cheapest first
+COMPARISON_COSTS = {"numeric": 1, "equality": 2, "in": 2, "ordering": 3, "string": 4}
+
+TOKEN_PATTERN = re.compile(r"""\s*(?:
+    (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    |(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    |(?P<op>==|!=|<=|>=|<|>|\(|\)|\[|\]|,)
+    |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+)""", re.VERBOSE)
+
+
+class ExpressionError(ValueError):
+    """
+    An expression rule that cannot be parsed or does not type-check.
+    """
+
+
+def tokenize(source):
+    """
+    Split an expression into (kind, value) tokens, kind being number, string, op, keyword or name.
+    """
+    tokens = []
+    position = 0
+    source = source.rstrip()
+    while position < len(source):
+        match = TOKEN_PATTERN.match(source, position)
+        if match is None or match.end() == position:
+            raise ExpressionError(f"Unexpected character {source[position:].lstrip()[:1]!r} at position {position}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "number":
+            value = float(value)
+        elif kind == "string":
+            value = ast.literal_eval(value)
+        elif kind == "name" and value in KEYWORDS:
+            kind = "keyword"
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    """
+    Recursive-descent parser for rule expressions.
+
+    Grammar, loosest binding first:
+        expression := conjunction ("or" conjunction)*
+        conjunction := negation ("and" negation)*
+        negation := "not" negation | "(" expression ")" | comparison
+        comparison := field (== | != | < | <= | > | >=) literal
+                    | field ["not"] "in" "[" literal ("," literal)* "]"
+                    | field (contains | startswith | endswith) string
+
+    Produces nested tuples: ("or", [...]), ("and", [...]), ("not", node)
+    and ("compare", field, op, literal).
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.tokens = tokenize(source)
+        self.position = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise ExpressionError("Expression is empty")
+        node = self._expression()
+        if self.position < len(self.tokens):
+            raise ExpressionError(f"Unexpected {self._describe(self.tokens[self.position])} after a complete expression")
+        return node
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _take(self, kind=None, value=None):
+        token = self._peek()
+        if token[0] is None:
+            raise ExpressionError("Expression ends unexpectedly")
+        if (kind is not None and token[0] != kind) or (value is not None and token[1] != value):
+            raise ExpressionError(f"Expected {value or kind}, got {self._describe(token)}")
+        self.position += 1
+        return token
+
+    def _accept(self, kind, value):
+        if self._peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    @staticmethod
+    def _describe(token):
+        return f"{token[0]} {token[1]!r}"
+
+    def _expression(self):
+        operands = [self._conjunction()]
+        while self._accept("keyword", "or"):
+            operands.append(self._conjunction())
+        return operands[0] if len(operands) == 1 else ("or", operands)
+
+    def _conjunction(self):
+        operands = [self._negation()]
+        while self._accept("keyword", "and"):
+            operands.append(self._negation())
+        return operands[0] if len(operands) == 1 else ("and", operands)
+
+    def _negation(self):
+        if self._accept("keyword", "not"):
+            return ("not", self._negation())
+        if self._accept("op", "("):
+            node = self._expression()
+            self._take("op", ")")
+            return node
+        return self._comparison()
+
+    def _comparison(self):
+        _, name = self._take("name")
+        field = FIELD_ALIASES.get(name, name)
+        if field not in NUMERIC_FIELDS and field not in STRING_FIELDS:
+            raise ExpressionError(f"Unknown field {name!r}")
+
+        kind, op = self._take()
+        if (kind, op) == ("keyword", "not"):
+            self._take("keyword", "in")
+            op = "not in"
+        elif kind not in ("op", "keyword") or (op not in COMPARISONS and op not in STRING_TESTS and op != "in"):
+            raise ExpressionError(f"Expected a comparison after {name!r}, got {self._describe((kind, op))}")
+
+        if op in ("in", "not in"):
+            literal = frozenset(self._list(field))
+        else:
+            literal = self._literal(field)
+            if op in STRING_TESTS and field in NUMERIC_FIELDS:
+                raise ExpressionError(f"{op} needs a text field, {name!r} is numeric")
+        return ("compare", field, op, literal)
+
+    def _list(self, field):
+        closing = "]" if self._accept("op", "[") else ")" if self._accept("op", "(") else None
+        if closing is None:
+            raise ExpressionError(f"Expected a [list] after in, got {self._describe(self._peek())}")
+        values = [self._literal(field)]
+        while self._accept("op", ","):
+            values.append(self._literal(field))
+        self._take("op", closing)
+        return values
+
+    def _literal(self, field):
+        kind, value = self._take()
+        expected = "number" if field in NUMERIC_FIELDS else "string"
+        if kind != expected:
+            raise ExpressionError(f"{field} is compared with a {expected}, got {self._describe((kind, value))}")
+        return value
+
+
+def parse(source):
+    return Parser(source).parse()
+
+
+def cost(node):
+    """
+    Estimate how expensive a node is to evaluate.
+    """
+    if node[0] in ("and", "or"):
+        return sum(cost(operand) for operand in node[1])
+    if node[0] == "not":
+        return cost(node[1])
+    _, field, op, _ = node
+    if op in ("in", "not in"):
+        return COMPARISON_COSTS["in"]
+    if op in STRING_TESTS:
+        return COMPARISON_COSTS["string"]
+    if field in NUMERIC_FIELDS:
+        return COMPARISON_COSTS["numeric"]
+    return COMPARISON_COSTS["equality"] if op in ("==", "!=") else COMPARISON_COSTS["ordering"]
+
+
+def fields(node):
+    if node[0] in ("and", "or"):
+        return set().union(*(fields(operand) for operand in node[1]))
+    if node[0] == "not":
+        return fields(node[1])
+    return {node[1]}
+
+
+def _test(op, literal):
+    # One comparison on a present value; missing values never match
+    if op == "in":
+        return lambda value: value in literal
+    if op == "not in":
+        return lambda value: value not in literal
+    if op in STRING_TESTS:
+        if op == "contains":
+            return lambda value: literal in value
+        return lambda value: getattr(value, op)(literal)
+    compare = COMPARISONS[op]
+    return lambda value: compare(value, literal)
+
+
+def compile_predicate(node):
+    """
+    Compile a parsed expression into a closure over a transaction dictionary.
+    """
+    kind = node[0]
+    if kind == "compare":
+        _, field, op, literal = node
+        test = _test(op, literal)
+
+        def predicate(transaction):
+            value = transaction.get(field)
+            return value is not None and test(value)
+        return predicate
+
+    if kind == "not":
+        operand = compile_predicate(node[1])
+        return lambda transaction: not operand(transaction)
+
+    operands = [compile_predicate(operand) for operand in sorted(node[1], key=cost)]
+    if kind == "and":
+        return lambda transaction: all(operand(transaction) for operand in operands)
+    return lambda transaction: any(operand(transaction) for operand in operands)
+
+
+def _mask_test(field, op, literal):
+    # Vectorized _test over the present values of a column
+    if field in NUMERIC_FIELDS:
+        if op in ("in", "not in"):
+            members = np.array(sorted(literal), dtype=float)
+            return lambda values: np.isin(values, members, invert=op == "not in")
+        compare = COMPARISONS[op]
+        return lambda values: compare(values, literal)
+
+    if op in ("in", "not in"):
+        members = list(literal)
+        if op == "in":
+            return lambda values: pd.Series(values, dtype=object).isin(members).to_numpy()
+        return lambda values: ~pd.Series(values, dtype=object).isin(members).to_numpy()
+    if op in STRING_TESTS:
+        test = _test(op, literal)
+        return lambda values: np.fromiter((test(value) for value in values), dtype=bool, count=len(values))
+    compare = COMPARISONS[op]
+    return lambda values: np.asarray(compare(values, literal), dtype=bool)
+
+
+def compile_mask(node):
+    """
+    Compile a parsed expression into a function of (columns, rows) returning a boolean array.
+
+    columns maps each field to a NumPy array over the whole batch and rows
+    selects the rows still to decide, so the operands of and/or after the
+    first only see the rows the earlier ones left undecided.
+    """
+    kind = node[0]
+    if kind == "compare":
+        _, field, op, literal = node
+        test = _mask_test(field, op, literal)
+
+        def mask(columns, rows):
+            values = columns[field][rows]
+            present = ~pd.isna(values)
+            result = np.zeros(len(rows), dtype=bool)
+            if present.any():
+                result[present] = test(values[present])
+            return result
+        return mask
+
+    if kind == "not":
+        operand = compile_mask(node[1])
+        return lambda columns, rows: ~operand(columns, rows)
+
+    operands = [compile_mask(operand) for operand in sorted(node[1], key=cost)]
+    # and narrows to the rows still true, or to the rows still false
+    decided = kind == "or"
+
+    def combine(columns, rows):
+        result = np.full(len(rows), not decided)
+        pending = np.arange(len(rows))
+        for operand in operands:
+            if not len(pending):
+                break
+            matched = operand(columns, rows[pending])
+            settled = matched if decided else ~matched
+            result[pending[settled]] = decided
+            pending = pending[~settled]
+        return result
+    return combine
+
+
+class Expression:
+    """
+    A rule expression compiled once into a per-transaction closure and a vectorized batch mask.
+    """
+
+    def __init__(self, source):
+        self.source = source.strip()
+        node = parse(self.source)
+        self.fields = fields(node)
+        self.cost = cost(node)
+        self._predicate = compile_predicate(node)
+        self._mask = compile_mask(node)
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+    def matches(self, transaction: dict):
+        return self._predicate(transaction)
+
+    def mask(self, frame):
+        """
+        Evaluate the expression over a DataFrame of transactions.
+
+        Args:
+            frame (DataFrame): One row per transaction with a column for each field the expression reads
+
+        Returns:
+            ndarray: True for each row the expression matches
+        """
+        columns = {
+            field: frame[field].to_numpy(dtype=float if field in NUMERIC_FIELDS else object)
+            for field in self.fields
+        }
+        return self._mask(columns, np.arange(len(frame)))
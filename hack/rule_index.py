@@ -0,0 +1,396 @@
+import logging
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from velocity import VelocityRule, VelocityRules, VelocityTracker
+from ip_trie import PrefixTrie, parse_network
+from rule_expr import Expression
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the fraud_rules fingerprint
+RULES_REFRESH_INTERVAL = float(os.getenv("RULES_REFRESH_INTERVAL", "5"))
+
+# Batches smaller than this are checked row by row, where DataFrame setup would cost more than it saves
+BATCH_VECTORIZE_MIN = int(os.getenv("BATCH_VECTORIZE_MIN", "64"))
+
+# Transaction fields read by the rules, in the order their reasons are reported
+BATCH_COLUMNS = ["transaction_id", "transaction_amount", "payer_ip", "payer_browser", "payment_gateway_bank",
+                 "payer_email"]
+
+
+def rules_fingerprint(rules):
+    """
+    Summarise a set of rule rows so changes can be detected cheaply.
+
+    The number of active rules together with the sum and maximum of their ids
+    changes whenever rules are added or deleted, and every UPDATE of a rule
+    bumps its revision, so the revision sum changes when one is edited in place.
+
+    Args:
+        rules (list): Rule rows as returned by fetch_rules
+
+    Returns:
+        tuple: (rule_count, id_sum, max_id, revision_sum)
+    """
+    ids = [int(rule.get("id") or 0) for rule in rules]
+    revisions = sum(int(rule.get("revision") or 0) for rule in rules)
+    return len(ids), sum(ids), max(ids, default=0), revisions
+
+
+class RuleIndex:
+    """
+    The active fraud rules compiled into hash sets, a single amount limit
+    and precompiled expressions.
+
+    Checking a transaction costs one set lookup per field instead of a pass
+    over every rule row.
+    """
+
+    def __init__(self, threshold=None, threshold_label=None, blocked_ips=(), blocked_browsers=(),
+                 blocked_gateways=(), blocked_emails=(), velocity=None, blocked_ranges=None, expressions=()):
+        self.threshold = threshold
+        self.threshold_label = threshold_label
+        self.blocked_ips = frozenset(blocked_ips)
+        self.blocked_browsers = frozenset(blocked_browsers)
+        self.blocked_gateways = frozenset(blocked_gateways)
+        self.blocked_emails = frozenset(blocked_emails)
+        self.velocity = velocity if velocity is not None else VelocityRules([], VelocityTracker())
+        self.blocked_ranges = blocked_ranges if blocked_ranges is not None else PrefixTrie()
+        self.expressions = tuple(expressions)
+        self.expression_fields = sorted(set().union(*(expression.fields for expression in self.expressions)))
+
+    @classmethod
+    def compile(cls, rules, tracker=None, ip_trie=None, velocity_enabled=True):
+        """
+        Build an index from fraud_rules rows.
+
+        Args:
+            rules (list): Rule rows as dictionaries
+            tracker (VelocityTracker): Sliding-window state for velocity rules, kept across recompiles
+            ip_trie (PrefixTrie): Blocked CIDR ranges from the previous compile, updated in place
+            velocity_enabled (bool): Whether velocity rules are enforced; their windows live in process
+                memory, so with several workers each would only count its own share of the traffic
+
+        Returns:
+            RuleIndex: The compiled index
+        """
+        threshold = None
+        threshold_label = None
+        blocked_ips, blocked_browsers, blocked_gateways, blocked_emails = set(), set(), set(), set()
+        blocked_networks = set()
+        velocity_rules = []
+        expressions = []
+
+        for rule in rules:
+            if rule.get("rule_type", "") == "Expression":
+                try:
+                    expressions.append(Expression(rule["expression"]))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error(f"Skipping invalid expression rule {rule.get('id')}: {e}")
+                continue
+
+            if rule.get("rule_type", "") == "Velocity":
+                try:
+                    velocity_rules.append(VelocityRule.from_row(rule))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error(f"Skipping invalid velocity rule {rule.get('id')}: {e}")
+                continue
+
+            rule_threshold = rule.get("threshold", None)
+            if rule.get("rule_type", "") == "Threshold Value" and rule_threshold is not None:
+                # Any exceeded threshold flags the transaction, so only the lowest one matters
+                if threshold is None or float(rule_threshold) < threshold:
+                    threshold = float(rule_threshold)
+                    threshold_label = rule_threshold
+
+            if rule.get("blocked_ip"):
+                # CIDR ranges go in the prefix tree, anything else is matched exactly
+                network = parse_network(rule["blocked_ip"])
+                if network is not None:
+                    blocked_networks.add(network)
+                else:
+                    blocked_ips.add(rule["blocked_ip"])
+            if rule.get("blocked_payer_browser"):
+                blocked_browsers.add(rule["blocked_payer_browser"])
+            if rule.get("blocked_payment_gateway"):
+                blocked_gateways.add(rule["blocked_payment_gateway"])
+            if rule.get("blocked_email"):
+                blocked_emails.add(rule["blocked_email"])
+
+        if velocity_rules and not velocity_enabled:
+            logger.warning(f"Ignoring {len(velocity_rules)} velocity rules: they need a single checker worker")
+            velocity_rules = []
+        velocity = VelocityRules(velocity_rules, tracker if tracker is not None else VelocityTracker())
+        ip_trie = ip_trie if ip_trie is not None else PrefixTrie()
+        added, removed = ip_trie.sync(blocked_networks)
+        if added or removed:
+            logger.info(f"Blocked IP ranges updated: {added} added, {removed} removed")
+        return cls(threshold, threshold_label, blocked_ips, blocked_browsers, blocked_gateways, blocked_emails,
+                   velocity, ip_trie, expressions)
+
+    def check(self, transaction: dict):
+        """
+        Evaluate a single transaction against the index.
+
+        Args:
+            transaction (dict): Transaction fields as sent to /detect
+
+        Returns:
+            dict: Detection result with transaction_id, is_fraud, fraud_source and fraud_reasons
+        """
+        fraud_reasons = []
+
+        if self.threshold is not None and transaction.get("transaction_amount", 0) > self.threshold:
+            fraud_reasons.append(f"High transaction amount (> {self.threshold_label})")
+
+        payer_ip = transaction.get("payer_ip")
+        if payer_ip in self.blocked_ips:
+            fraud_reasons.append(f"Blocked IP: {payer_ip}")
+        elif payer_ip and self.blocked_ranges:
+            blocked_range = self.blocked_ranges.lookup(payer_ip)
+            if blocked_range is not None:
+                fraud_reasons.append(f"Blocked IP: {blocked_range}")
+
+        payer_browser = transaction.get("payer_browser")
+        if payer_browser in self.blocked_browsers:
+            fraud_reasons.append(f"Blocked Browser: {payer_browser}")
+
+        payment_gateway = transaction.get("payment_gateway_bank")
+        if payment_gateway in self.blocked_gateways:
+            fraud_reasons.append(f"Blocked Payment Gateway: {payment_gateway}")
+
+        payer_email = transaction.get("payer_email")
+        if payer_email in self.blocked_emails:
+            fraud_reasons.append(f"Blocked Email: {payer_email}")
+
+        for expression in self.expressions:
+            if expression.matches(transaction):
+                fraud_reasons.append(f"Rule matched: {expression.source}")
+
+        if self.velocity:
+            fraud_reasons.extend(self.velocity.check(transaction))
+
+        return {
+            "transaction_id": transaction.get("transaction_id"),
+            "is_fraud": bool(fraud_reasons),
+            "fraud_source": "rule",
+            "fraud_reasons": fraud_reasons
+        }
+
+    def check_batch(self, transactions):
+        """
+        Evaluate many transactions at once with one vectorized mask per rule or expression.
+
+        The results are identical to calling check on each transaction.
+
+        Args:
+            transactions (list): Transaction dictionaries
+
+        Returns:
+            list: Detection results in the same order as transactions
+        """
+        if len(transactions) < BATCH_VECTORIZE_MIN:
+            return [self.check(transaction) for transaction in transactions]
+
+        columns = BATCH_COLUMNS + [field for field in self.expression_fields if field not in BATCH_COLUMNS]
+        frame = pd.DataFrame.from_records(transactions, columns=columns)
+        fraud_reasons = [[] for _ in range(len(frame))]
+
+        if self.threshold is not None:
+            amounts = frame["transaction_amount"].fillna(0).to_numpy(dtype=float)
+            reason = f"High transaction amount (> {self.threshold_label})"
+            for i in np.flatnonzero(amounts > self.threshold):
+                fraud_reasons[i].append(reason)
+
+        payer_ips = frame["payer_ip"]
+        exact_ip = payer_ips.isin(list(self.blocked_ips)).to_numpy()
+        for i in np.flatnonzero(exact_ip):
+            fraud_reasons[i].append(f"Blocked IP: {payer_ips.iat[i]}")
+        if self.blocked_ranges:
+            # One trie lookup per distinct address rather than per row
+            unmatched = np.flatnonzero(~exact_ip & payer_ips.notna().to_numpy())
+            candidates = payer_ips.iloc[unmatched]
+            ranges = {address: self.blocked_ranges.lookup(address) for address in candidates.unique()}
+            for i, address in zip(unmatched, candidates):
+                if ranges[address] is not None:
+                    fraud_reasons[i].append(f"Blocked IP: {ranges[address]}")
+
+        for column, blocked, label in (
+                ("payer_browser", self.blocked_browsers, "Blocked Browser"),
+                ("payment_gateway_bank", self.blocked_gateways, "Blocked Payment Gateway"),
+                ("payer_email", self.blocked_emails, "Blocked Email")):
+            if not blocked:
+                continue
+            values = frame[column]
+            for i in np.flatnonzero(values.isin(list(blocked)).to_numpy()):
+                fraud_reasons[i].append(f"{label}: {values.iat[i]}")
+
+        for expression in self.expressions:
+            reason = f"Rule matched: {expression.source}"
+            for i in np.flatnonzero(expression.mask(frame)):
+                fraud_reasons[i].append(reason)
+
+        if self.velocity:
+            # Sliding windows depend on arrival order, so these are counted row by row
+            for reasons, transaction in zip(fraud_reasons, transactions):
+                reasons.extend(self.velocity.check(transaction))
+
+        return [
+            {
+                "transaction_id": transaction_id,
+                "is_fraud": bool(reasons),
+                "fraud_source": "rule",
+                "fraud_reasons": reasons
+            }
+            for transaction_id, reasons in zip(frame["transaction_id"].tolist(), fraud_reasons)
+        ]
+
+
+class RuleCache:
+    """
+    Holds the current RuleIndex and rebuilds it only when the rule set changes.
+
+    A background thread polls a cheap fingerprint query and reloads the full
+    rule set only when the fingerprint differs from the one last compiled.
+    With a RuleSnapshot, only the worker holding the snapshot's leader lock
+    polls the database and publishes what it loads; the others compile from
+    the published snapshot whenever its generation changes.
+    """
+
+    def __init__(self, load_rules, load_fingerprint, refresh_interval=RULES_REFRESH_INTERVAL, snapshot=None,
+                 velocity_enabled=True):
+        """
+        Args:
+            load_rules (callable): Returns the active rule rows
+            load_fingerprint (callable): Returns the rules_fingerprint of the active rules
+            refresh_interval (float): Seconds between fingerprint checks
+            snapshot (RuleSnapshot): Shared snapshot to publish to or follow, if any
+            velocity_enabled (bool): Whether velocity rules are enforced, see RuleIndex.compile
+        """
+        self._load_rules = load_rules
+        self._load_fingerprint = load_fingerprint
+        self.refresh_interval = refresh_interval
+        self.snapshot = snapshot
+        self.velocity_enabled = velocity_enabled
+        self._index = None
+        self._rules = None
+        self._fingerprint = None
+        self._generation = 0
+        self._last_check = 0.0
+        self._tracker = VelocityTracker()
+        self._ip_trie = PrefixTrie()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self):
+        """
+        Return the current index, loading it on first use.
+
+        Returns:
+            RuleIndex: The compiled active rules
+        """
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None and self.snapshot is not None:
+                    self._follow()
+                if self._index is None:
+                    self._reload()
+                index = self._index
+        return index
+
+    def refresh(self, force=False):
+        """
+        Reload the rules if the fingerprint has changed.
+
+        Args:
+            force (bool): Reload even if the fingerprint is unchanged
+
+        Returns:
+            bool: True if the index was rebuilt
+        """
+        with self._lock:
+            if self.snapshot is not None:
+                # Catch up with the last published version before deciding whether to query the database
+                changed = self._follow()
+                if not self.snapshot.lead():
+                    return changed
+            self._last_check = time.monotonic()
+            if force or self._index is None or self._load_fingerprint() != self._fingerprint:
+                self._reload()
+                changed = True
+            else:
+                changed = False
+            if self.snapshot is not None and (changed or not self._generation or self.snapshot.generation != self._generation):
+                self._generation = self.snapshot.publish(self._rules, self._fingerprint)
+                logger.info(f"Published fraud rule snapshot generation {self._generation}")
+            return changed
+
+    def _reload(self):
+        rules = self._load_rules()
+        self._apply(rules, rules_fingerprint(rules))
+        logger.info(f"Compiled {len(rules)} active fraud rules")
+
+    def _apply(self, rules, fingerprint):
+        self._index = RuleIndex.compile(rules, self._tracker, self._ip_trie, self.velocity_enabled)
+        self._rules = rules
+        self._fingerprint = fingerprint
+
+    def _follow(self):
+        generation = self.snapshot.generation
+        if generation == 0 or generation == self._generation:
+            return False
+        try:
+            rules, fingerprint = self.snapshot.read(generation)
+        except (OSError, ValueError) as e:
+            # Pruned or half-written by a leader that died; the next generation will do
+            logger.warning(f"Could not read fraud rule snapshot generation {generation}: {e}")
+            return False
+        self._generation = generation
+        if fingerprint != self._fingerprint or self._index is None:
+            self._apply(rules, fingerprint)
+            logger.info(f"Compiled {len(rules)} active fraud rules from snapshot generation {generation}")
+            return True
+        return False
+
+    def start(self):
+        """
+        Start the background refresher thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rule-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background refresher thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.refresh_interval)
+            self._thread = None
+        if self.snapshot is not None:
+            self.snapshot.resign()
+
+    def _run(self):
+        interval = self.refresh_interval
+        if self.snapshot is not None:
+            # Followers only read the generation word, so they can check far more often than the database is polled
+            interval = min(interval, self.snapshot.poll_interval)
+        while not self._stop.wait(interval):
+            try:
+                if self.snapshot is not None and time.monotonic() - self._last_check < self.refresh_interval:
+                    with self._lock:
+                        self._follow()
+                    continue
+                self.refresh()
+            except Exception as e:
+                # Keep serving the last good index if the database is unavailable
+                logger.error(f"Error refreshing fraud rules: {e}")
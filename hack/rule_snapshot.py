@@ -0,0 +1,153 @@
+import os
+import json
+import mmap
+import glob
+import struct
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, each worker refreshes on its own
+    fcntl = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Directory shared by all workers for the rule snapshot; empty disables snapshots
+RULES_SNAPSHOT_DIR = os.getenv("RULES_SNAPSHOT_DIR", "")
+# Seconds between generation checks by workers that are not refreshing from the database
+RULES_SNAPSHOT_POLL_INTERVAL = float(os.getenv("RULES_SNAPSHOT_POLL_INTERVAL", "0.5"))
+# Older snapshot files kept for workers still reading them
+RULES_SNAPSHOT_KEEP = int(os.getenv("RULES_SNAPSHOT_KEEP", "2"))
+
+# The control file holds one little-endian unsigned 64-bit generation number
+GENERATION = struct.Struct("<Q")
+
+
+class RuleSnapshot:
+    """
+    Rule rows published by one process and shared with every worker on the host.
+
+    Each version is written once to rules.<generation>.snap and then made
+    current by storing its generation in a small mmap'd control file. Readers
+    check that word straight from their own mapping, so noticing a new version
+    costs no system call and no database query. Exactly one process holds an
+    exclusive flock on the leader file and is the only one that polls MySQL.
+    If it exits, the kernel drops the lock and another worker takes over.
+
+    Only the generation word is shared in memory. When it changes, each
+    worker reads and parses the whole data file into its own rule rows and
+    compiles its own RuleIndex, so the snapshot saves database polling, not
+    per-worker copies of the rules.
+    """
+
+    def __init__(self, directory=RULES_SNAPSHOT_DIR, poll_interval=RULES_SNAPSHOT_POLL_INTERVAL,
+                 keep=RULES_SNAPSHOT_KEEP):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+        fd = os.open(os.path.join(directory, "control"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < GENERATION.size:
+                os.ftruncate(fd, GENERATION.size)
+            self._control = mmap.mmap(fd, GENERATION.size)
+        finally:
+            os.close(fd)
+        self._leader_fd = None
+
+    @property
+    def generation(self):
+        """
+        The generation currently published, 0 before the first publish.
+        """
+        return GENERATION.unpack_from(self._control)[0]
+
+    @property
+    def is_leader(self):
+        return self._leader_fd is not None
+
+    def lead(self):
+        """
+        Try to become the process that refreshes from the database.
+
+        Returns:
+            bool: True if this process holds the leader lock
+        """
+        if self._leader_fd is not None:
+            return True
+        if fcntl is None:
+            return True
+        fd = os.open(os.path.join(self.directory, "leader.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        logger.info(f"Process {os.getpid()} is now refreshing fraud rules for {self.directory}")
+        return True
+
+    def resign(self):
+        if self._leader_fd is not None:
+            os.close(self._leader_fd)
+            self._leader_fd = None
+
+    def _path(self, generation):
+        return os.path.join(self.directory, f"rules.{generation}.snap")
+
+    def publish(self, rules, fingerprint):
+        """
+        Write a new snapshot and make it current. Only the leader may publish.
+
+        Args:
+            rules (list): Rule rows as dictionaries
+            fingerprint (tuple): rules_fingerprint of the rows
+
+        Returns:
+            int: The new generation
+        """
+        if not self.is_leader:
+            raise RuntimeError("Only the leader process can publish rule snapshots")
+        generation = self.generation + 1
+        # DECIMAL thresholds and DATETIME columns are stored as their text form
+        payload = json.dumps({"fingerprint": list(fingerprint), "rules": rules}, default=str).encode("utf-8")
+        path = self._path(generation)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        # The data file is complete before its generation becomes visible
+        GENERATION.pack_into(self._control, 0, generation)
+        self._control.flush()
+        self._prune(generation)
+        return generation
+
+    def _prune(self, generation):
+        for path in glob.glob(os.path.join(self.directory, "rules.*.snap")):
+            try:
+                old = int(os.path.basename(path).split(".")[1])
+            except ValueError:
+                continue
+            if old <= generation - self.keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def read(self, generation):
+        """
+        Read and parse one snapshot into a private copy of its rule rows.
+
+        Returns:
+            tuple: (rule rows, fingerprint)
+        """
+        with open(self._path(generation), "rb") as f:
+            snapshot = json.loads(f.read())
+        return snapshot["rules"], tuple(snapshot["fingerprint"])
+
+    def close(self):
+        self.resign()
+        self._control.close()
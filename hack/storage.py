@@ -0,0 +1,379 @@
+import os
+import sqlite3
+import logging
+import threading
+from dotenv import load_dotenv
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Which backend get_storage creates: mysql or sqlite
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mysql").lower()
+# Database file for the sqlite backend
+SQLITE_PATH = os.getenv("SQLITE_PATH", "fraud_detection.db")
+# Rows per multi-row INSERT when storing a batch of transactions
+BATCH_INSERT_CHUNK_SIZE = int(os.getenv("BATCH_INSERT_CHUNK_SIZE", "1000"))
+
+# transactions columns in the order of the rows passed to insert_transactions
+TRANSACTION_COLUMNS = [
+    "transaction_id_anonymous", "transaction_date", "transaction_amount", "transaction_channel",
+    "transaction_payment_mode_anonymous", "payment_gateway_bank_anonymous", "payer_email_anonymous",
+    "payer_mobile_anonymous", "payer_browser_anonymous", "payee_id", "is_fraud", "payee_ip_anonymous"
+]
+
+# Dashboard view of the newest transactions, used by db_connector
+RECENT_TRANSACTIONS_QUERY = """
+SELECT
+    transaction_id_anonymous as Transaction_ID,
+    payee_id_anonymous as Payee_ID,
+    payer_email_anonymous as Payer_ID,
+    transaction_amount as Amount,
+    transaction_channel as Transaction_Channel,
+    transaction_payment_mode_anonymous as Transaction_Payment_Mode,
+    payment_gateway_bank_anonymous as Payment_Gateway_Bank,
+    is_fraud as is_fraud_predicted,
+    FALSE as is_fraud_reported,
+    transaction_date as Timestamp,
+    payer_browser_anonymous,
+    payee_ip_anonymous,
+    payer_mobile_anonymous
+FROM transactions
+ORDER BY transaction_date DESC
+LIMIT {placeholder}
+"""
+
+# The fraud_rules column holding the value of each single-value rule type
+RULE_VALUE_COLUMNS = {
+    "Threshold Value": "threshold",
+    "Blocked IP": "blocked_ip",
+    "Blocked Payment Gateway": "blocked_payment_gateway",
+    "Blocked Browser": "blocked_payer_browser",
+    "Blocked Email": "blocked_email",
+    "Expression": "expression"
+}
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fraud_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rule_type TEXT NOT NULL,
+    threshold REAL,
+    blocked_ip TEXT,
+    blocked_payer_browser TEXT,
+    blocked_payment_gateway TEXT,
+    blocked_email TEXT,
+    velocity_key TEXT,
+    velocity_window_minutes INTEGER,
+    velocity_max_count INTEGER,
+    velocity_max_amount REAL,
+    expression TEXT,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS fraud_rules_revision AFTER UPDATE ON fraud_rules
+FOR EACH ROW WHEN NEW.revision = OLD.revision
+BEGIN
+    UPDATE fraud_rules SET revision = OLD.revision + 1 WHERE id = NEW.id;
+END;
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transaction_id_anonymous TEXT NOT NULL UNIQUE,
+    transaction_date TEXT,
+    transaction_amount REAL,
+    transaction_channel TEXT,
+    transaction_payment_mode_anonymous TEXT,
+    payment_gateway_bank_anonymous TEXT,
+    payer_email_anonymous TEXT,
+    payer_mobile_anonymous TEXT,
+    payer_browser_anonymous TEXT,
+    payee_id TEXT,
+    payee_id_anonymous TEXT,
+    is_fraud INTEGER,
+    payee_ip_anonymous TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (transaction_date);
+"""
+
+
+def rule_columns(rule_type, value):
+    """
+    Map a rule entered in the admin UI to its fraud_rules columns.
+
+    Args:
+        rule_type (str): One of the rule types offered by the UI
+        value: The entered value, or a dict of velocity_* settings for Velocity rules
+
+    Returns:
+        dict: Column name to value, including rule_type
+    """
+    if rule_type == "Velocity":
+        return {
+            "rule_type": rule_type,
+            "velocity_key": value["key"],
+            "velocity_window_minutes": value["window_minutes"],
+            "velocity_max_count": value["max_count"],
+            "velocity_max_amount": value["max_amount"]
+        }
+    if rule_type not in RULE_VALUE_COLUMNS:
+        raise ValueError(f"Unknown rule type: {rule_type}")
+    return {"rule_type": rule_type, RULE_VALUE_COLUMNS[rule_type]: value}
+
+
+class StorageBackend:
+    """
+    Where fraud rules and scored transactions are kept.
+
+    Subclasses provide a DB-API connection and their SQL dialect; the
+    queries themselves are shared.
+    """
+
+    name = None
+    # DB-API parameter marker and the INSERT variant that skips duplicate keys
+    placeholder = "%s"
+    insert_ignore = "INSERT IGNORE"
+
+    def connect(self):
+        """
+        Get a connection; close() must be called when done with it.
+        """
+        raise NotImplementedError
+
+    def dict_cursor(self, conn):
+        raise NotImplementedError
+
+    def fetch_rules(self):
+        """
+        Returns:
+            list: The active fraud_rules rows as dictionaries
+        """
+        conn = self.connect()
+        try:
+            cursor = self.dict_cursor(conn)
+            cursor.execute("SELECT * FROM fraud_rules WHERE is_active = 1")
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def fetch_rules_fingerprint(self):
+        """
+        Returns:
+            tuple: (rule_count, id_sum, max_id, revision_sum) of the active rules, as rules_fingerprint computes it
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*), COALESCE(SUM(id), 0), COALESCE(MAX(id), 0), COALESCE(SUM(revision), 0) "
+                           "FROM fraud_rules WHERE is_active = 1")
+            count, id_sum, max_id, revision_sum = cursor.fetchone()
+            return int(count), int(id_sum), int(max_id), int(revision_sum)
+        finally:
+            conn.close()
+
+    def add_rule(self, rule_type, value):
+        """
+        Store a new active rule.
+
+        Args:
+            rule_type (str): One of the rule types offered by the admin UI
+            value: The rule's value, see rule_columns
+        """
+        columns = rule_columns(rule_type, value)
+        columns["is_active"] = 1
+        query = (f"INSERT INTO fraud_rules ({', '.join(columns)}) "
+                 f"VALUES ({', '.join([self.placeholder] * len(columns))})")
+        conn = self.connect()
+        try:
+            conn.cursor().execute(query, tuple(columns.values()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete_rule(self, rule_id):
+        conn = self.connect()
+        try:
+            conn.cursor().execute(f"DELETE FROM fraud_rules WHERE id = {self.placeholder}", (rule_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def insert_transactions(self, rows, chunk_size=None):
+        """
+        Store scored transactions in one database transaction.
+
+        Rows whose transaction_id is already stored are skipped, so retried
+        requests are only stored once.
+
+        Args:
+            rows (list): Tuples of values in TRANSACTION_COLUMNS order
+            chunk_size (int): Rows per multi-row INSERT, BATCH_INSERT_CHUNK_SIZE if omitted
+        """
+        if not rows:
+            return
+        chunk_size = chunk_size or BATCH_INSERT_CHUNK_SIZE
+        query = (f"{self.insert_ignore} INTO transactions ({', '.join(TRANSACTION_COLUMNS)}) "
+                 f"VALUES ({', '.join([self.placeholder] * len(TRANSACTION_COLUMNS))})")
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            for start in range(0, len(rows), chunk_size):
+                cursor.executemany(query, rows[start:start + chunk_size])
+            conn.commit()
+        finally:
+            # Closing without a commit rolls the batch back
+            conn.close()
+
+    def fetch_recent_transactions(self, limit=1000):
+        """
+        Get the newest transactions in the dashboard's column layout.
+
+        Returns:
+            tuple: (column names, list of row tuples)
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(RECENT_TRANSACTIONS_QUERY.format(placeholder=self.placeholder), (int(limit),))
+            return [column[0] for column in cursor.description], cursor.fetchall()
+        finally:
+            conn.close()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Connection usage metrics, empty for backends without a pool
+        """
+        return {}
+
+    def close(self):
+        pass
+
+
+class MySQLStorage(StorageBackend):
+    """
+    MySQL through the shared db_pool connection pool.
+    """
+
+    name = "mysql"
+
+    def __init__(self, **connect_kwargs):
+        # Imported here so the sqlite backend works without mysql-connector installed
+        from db_pool import get_pool
+        self.pool = get_pool(**connect_kwargs)
+
+    def connect(self):
+        return self.pool.get_connection()
+
+    def dict_cursor(self, conn):
+        return conn.cursor(dictionary=True)
+
+    def stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.close_all()
+
+
+class _SQLiteConnection:
+    # Per-thread connections stay open; close() only ends the current transaction
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    An embedded SQLite database file in WAL mode, for single-node deployments and load tests.
+
+    Each thread keeps its own connection. WAL lets readers run alongside the
+    single writer, and synchronous=NORMAL only fsyncs at checkpoints.
+    """
+
+    name = "sqlite"
+    placeholder = "?"
+    insert_ignore = "INSERT OR IGNORE"
+
+    def __init__(self, path=SQLITE_PATH, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        conn = self.connect()
+        # Files created before rules had a revision get the column before the trigger that bumps it
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(fraud_rules)").fetchall()]
+        if columns and "revision" not in columns:
+            conn.execute("ALTER TABLE fraud_rules ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        conn.executescript(SQLITE_SCHEMA)
+        conn.commit()
+        logger.info(f"Using SQLite storage at {path}")
+
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            raw = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.execute("PRAGMA synchronous=NORMAL")
+            conn = self._local.conn = _SQLiteConnection(raw)
+            with self._lock:
+                self._connections.append(raw)
+        return conn
+
+    def dict_cursor(self, conn):
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        return _DictCursor(cursor)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+class _DictCursor:
+    # fetchall() as dictionaries, like mysql.connector's cursor(dictionary=True)
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def fetchall(self):
+        return [dict(row) for row in self._cursor.fetchall()]
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage(**connect_kwargs):
+    """
+    Get the process-wide storage backend selected by STORAGE_BACKEND, creating it on first use.
+
+    Args:
+        **connect_kwargs: MySQL connection settings passed to get_pool; ignored by sqlite
+
+    Returns:
+        StorageBackend: The shared backend
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "sqlite":
+                    _storage = SQLiteStorage()
+                elif STORAGE_BACKEND == "mysql":
+                    _storage = MySQLStorage(**connect_kwargs)
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _storage
@@ -0,0 +1,405 @@
+import io
+import os
+import csv
+import glob
+import time
+import logging
+import threading
+from collections import deque
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, only the in-process lock serializes appends
+    fcntl = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Directory holding the transaction log segments
+TXLOG_DIR = os.getenv("TXLOG_DIR", os.path.join("data", "txlog"))
+# A segment is sealed and a new one started once it reaches this size or age
+TXLOG_SEGMENT_BYTES = int(os.getenv("TXLOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+TXLOG_SEGMENT_SECONDS = float(os.getenv("TXLOG_SEGMENT_SECONDS", "3600"))
+# Longest time appended rows may wait for an fsync; 0 fsyncs every append
+TXLOG_FSYNC_INTERVAL = float(os.getenv("TXLOG_FSYNC_INTERVAL", "0.2"))
+# Newest appended rows kept in memory for tail reads
+TXLOG_RECENT_ROWS = int(os.getenv("TXLOG_RECENT_ROWS", "10000"))
+# Bytes read per step when seeking backwards through a segment
+TAIL_BLOCK_SIZE = 64 * 1024
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".csv"
+
+
+def segment_paths(directory=TXLOG_DIR):
+    """
+    Returns:
+        list: Paths of the log's segments, oldest first
+    """
+    return sorted(glob.glob(os.path.join(directory, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")))
+
+
+def segment_number(path):
+    return int(os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+def read_segment(path, columns=None):
+    """
+    Read one segment as a DataFrame.
+
+    Only complete lines are read: a row the writer has not finished, or one
+    torn by a crash, is left out.
+
+    Args:
+        path (str): Segment file
+        columns (list): Columns to keep, all if omitted
+
+    Returns:
+        DataFrame: The segment's rows
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    end = data.rfind(b"\n")
+    if end < 0:
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(io.BytesIO(data[:end + 1]), usecols=columns)
+
+
+def read_lines_before(path, before=None, limit=100, block_size=TAIL_BLOCK_SIZE):
+    """
+    Read the last complete rows of a CSV file that start before a byte offset, seeking backwards.
+
+    Only the blocks holding those rows are read, however long the file is.
+    Values must not contain line breaks, which TransactionLog ensures.
+
+    Args:
+        path (str): CSV file with a header row
+        before (int): Byte offset of a row start; rows from there on are not read. The end of the file if omitted
+        limit (int): Most rows to return
+        block_size (int): Bytes read per backwards step
+
+    Returns:
+        tuple: (header line, list of (offset, line) oldest first)
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        if not header.endswith(b"\n"):
+            return b"", []
+        first = len(header)
+        end = os.fstat(f.fileno()).st_size if before is None else before
+        position = end
+        data = b""
+        newlines = 0
+        while position > first and newlines <= limit:
+            start = max(first, position - block_size)
+            f.seek(start)
+            chunk = f.read(position - start)
+            data = chunk + data
+            newlines += chunk.count(b"\n")
+            position = start
+            block_size *= 2
+
+    # A row still being written at the end is left out, as is a partial row at the front
+    data = data[:data.rfind(b"\n") + 1]
+    if position > first:
+        cut = data.find(b"\n") + 1
+        data = data[cut:]
+        position += cut
+    lines = []
+    for line in data.splitlines(keepends=True):
+        lines.append((position, line))
+        position += len(line)
+    return header, lines[-limit:] if limit else []
+
+
+def tail_csv(path, limit=100, before=None):
+    """
+    Get the last rows of a CSV file that start before a byte offset.
+
+    Returns:
+        tuple: (list of row dictionaries, list of their byte offsets), oldest first
+    """
+    header, lines = read_lines_before(path, before, limit)
+    if not lines:
+        return [], []
+    df = pd.read_csv(io.BytesIO(header + b"".join(line for _, line in lines)))
+    return df.to_dict(orient="records"), [offset for offset, _ in lines]
+
+
+def read_log(directory=TXLOG_DIR, columns=None, limit=None):
+    """
+    Read the transaction log without taking the writer lock.
+
+    Args:
+        directory (str): Log directory
+        columns (list): Columns to keep, all if omitted
+        limit (int): Only the newest limit rows; segments older than needed are not read
+
+    Returns:
+        DataFrame: The logged rows, oldest first, or None if nothing has been logged
+    """
+    frames = []
+    rows = 0
+    for path in reversed(segment_paths(directory)):
+        frame = read_segment(path, columns)
+        if frame.empty:
+            continue
+        frames.append(frame)
+        rows += len(frame)
+        if limit is not None and rows >= limit:
+            break
+    if not frames:
+        return None
+    df = pd.concat(reversed(frames), ignore_index=True)
+    if limit is not None and len(df) > limit:
+        df = df.tail(limit).reset_index(drop=True)
+    return df
+
+
+def _one_line(value):
+    if isinstance(value, str) and ("\n" in value or "\r" in value):
+        return value.replace("\r\n", " ").replace("\n", " ").replace("\r", " ")
+    return value
+
+
+class RecentRows:
+    """
+    The newest rows appended to a log, with their positions, in a fixed-size ring buffer.
+
+    The buffer always holds a contiguous run of rows ending at the newest
+    one, so a page older than its first row is read from disk starting at
+    that row's position.
+    """
+
+    def __init__(self, capacity=TXLOG_RECENT_ROWS):
+        self._rows = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def extend(self, positions, rows):
+        with self._lock:
+            self._rows.extend(zip(positions, rows))
+
+    def before(self, position=None, limit=100):
+        """
+        Get the newest buffered rows older than a position.
+
+        Args:
+            position (tuple): (segment number, byte offset); the newest rows if omitted
+            limit (int): Most rows to return
+
+        Returns:
+            list: (position, row) pairs, oldest first
+        """
+        entries = []
+        with self._lock:
+            if limit <= 0 or position is not None and (not self._rows or position <= self._rows[0][0]):
+                return entries
+            for entry in reversed(self._rows):
+                if position is None or entry[0] < position:
+                    entries.append(entry)
+                    if len(entries) >= limit:
+                        break
+            entries.reverse()
+            return entries
+
+
+class TransactionLog:
+    """
+    An append-only transaction history split into CSV segments.
+
+    Appends go to the newest segment and never touch earlier rows, so their
+    cost does not depend on how much history there is. Each segment starts
+    with its own header row and is sealed once it reaches segment_bytes or
+    segment_seconds; every process start opens a fresh segment. Appends are
+    written straight to the file, but fsync runs at most every fsync_interval
+    seconds, so a burst of appends shares one disk flush.
+
+    One process at a time may write: it holds an exclusive flock on the
+    writer lock file, and appends within it are serialized by a lock.
+    Readers use read_log and need no lock.
+    """
+
+    def __init__(self, columns, directory=TXLOG_DIR, segment_bytes=TXLOG_SEGMENT_BYTES,
+                 segment_seconds=TXLOG_SEGMENT_SECONDS, fsync_interval=TXLOG_FSYNC_INTERVAL, on_seal=None,
+                 recent=None):
+        """
+        Args:
+            columns (list): Column names, in the order values are appended
+            directory (str): Log directory
+            segment_bytes (int): Size at which a segment is sealed
+            segment_seconds (float): Age at which a segment is sealed
+            fsync_interval (float): Longest time appended rows may wait for an fsync
+            on_seal (callable): Called with the path of each segment once it is sealed and
+                will not change again; it runs under the append lock, so it must not block
+            recent (RecentRows): Ring buffer given every appended row, in log order
+        """
+        self.columns = list(columns)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.fsync_interval = fsync_interval
+        self.on_seal = on_seal
+        self.recent = recent
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        self._file = None
+        self._path = None
+        self._opened_at = 0.0
+        self._dirty = False
+        self._last_sync = 0.0
+        self._syncer = None
+        self._closing = threading.Event()
+
+        # Metrics
+        self.appended = 0
+        self.syncs = 0
+        self.rotations = 0
+
+    def _lock_writer(self):
+        if self._lock_fd is not None or fcntl is None:
+            return
+        fd = os.open(os.path.join(self.directory, "writer.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise RuntimeError(f"Another process is already writing the transaction log in {self.directory}")
+        self._lock_fd = fd
+
+    def _open_segment(self):
+        paths = segment_paths(self.directory)
+        number = segment_number(paths[-1]) + 1 if paths else 1
+        self._path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:010d}{SEGMENT_SUFFIX}")
+        self._file = open(self._path, "ab")
+        self._opened_at = time.monotonic()
+        self._write([self.columns])
+        logger.info(f"Appending transactions to {self._path}")
+
+    def _seal_segment(self):
+        self._sync()
+        self._file.close()
+        self._file = None
+        self.rotations += 1
+        if self.on_seal is not None:
+            self.on_seal(self._path)
+
+    def _write(self, rows):
+        # Returns the byte offset at which each row starts
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        offsets = []
+        lines = []
+        offset = self._file.tell()
+        for row in rows:
+            writer.writerow(row)
+            line = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            offsets.append(offset)
+            lines.append(line)
+            offset += len(line)
+        self._file.write(b"".join(lines))
+        self._file.flush()
+        self._dirty = True
+        return offsets
+
+    def _sync(self):
+        if self._dirty:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+            self.syncs += 1
+        self._last_sync = time.monotonic()
+
+    def append(self, rows):
+        """
+        Append rows to the log in one write.
+
+        Line breaks in values are replaced by spaces, so every row is one line.
+
+        Args:
+            rows (list): Dictionaries keyed by column name; missing columns are left empty
+
+        Returns:
+            list: The (segment number, byte offset) position of each row
+        """
+        if not rows:
+            return []
+        values = [[_one_line(row.get(column)) for column in self.columns] for row in rows]
+        with self._lock:
+            if self._file is None:
+                self._lock_writer()
+                self._open_segment()
+                self._start_syncer()
+            elif (self._file.tell() >= self.segment_bytes
+                  or time.monotonic() - self._opened_at >= self.segment_seconds):
+                self._seal_segment()
+                self._open_segment()
+            offsets = self._write(values)
+            self.appended += len(values)
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            number = segment_number(self._path)
+            positions = [(number, offset) for offset in offsets]
+            if self.recent is not None:
+                self.recent.extend(positions, [dict(zip(self.columns, row)) for row in values])
+            return positions
+
+    def _start_syncer(self):
+        if self.fsync_interval <= 0 or self._syncer is not None:
+            return
+        self._syncer = threading.Thread(target=self._run_syncer, name="txlog-fsync", daemon=True)
+        self._syncer.start()
+
+    def _run_syncer(self):
+        # fsyncs the tail of a burst that no later append picked up
+        while not self._closing.wait(self.fsync_interval):
+            with self._lock:
+                if self._file is not None and self._dirty:
+                    self._sync()
+
+    def sealed_segments(self):
+        """
+        Returns:
+            list: Paths of all segments except the one currently appended to, oldest first
+        """
+        with self._lock:
+            return [path for path in segment_paths(self.directory) if path != self._path or self._file is None]
+
+    def sync(self):
+        """
+        fsync everything appended so far.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "segment": self._path,
+                "segment_bytes": self._file.tell() if self._file is not None else 0,
+                "appended": self.appended,
+                "syncs": self.syncs,
+                "rotations": self.rotations
+            }
+
+    def close(self):
+        """
+        fsync and close the current segment and release the writer lock.
+        """
+        self._closing.set()
+        if self._syncer is not None:
+            self._syncer.join()
+            self._syncer = None
+        with self._lock:
+            if self._file is not None:
+                self._seal_segment()
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
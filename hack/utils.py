@@ -3,6 +3,20 @@ import numpy as np
 from datetime import datetime, timedelta
 from sklearn.metrics import confusion_matrix, precision_score, recall_score
 
+# Columns the dashboard needs in every dataset
+REQUIRED_COLUMNS = [
+    'Transaction_ID',
+    'Timestamp',
+    'Payer_ID',
+    'Payee_ID',
+    'is_fraud_predicted',
+    'is_fraud_reported',
+    'Transaction_Channel',
+    'Transaction_Payment_Mode',
+    'Payment_Gateway_Bank',
+    'Amount'
+]
+
 
 def process_data(data):
     """
@@ -15,21 +29,8 @@ def process_data(data):
     Returns:
         DataFrame: Processed data ready for analysis
     """
-    required_columns = [
-        'Transaction_ID',
-        'Timestamp',
-        'Payer_ID',
-        'Payee_ID',
-        'is_fraud_predicted',
-        'is_fraud_reported',
-        'Transaction_Channel',
-        'Transaction_Payment_Mode',
-        'Payment_Gateway_Bank',
-        'Amount'
-    ]
-
     # Check for required columns
-    missing_columns = set(required_columns) - set(data.columns)
+    missing_columns = set(REQUIRED_COLUMNS) - set(data.columns)
     if missing_columns:
         raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
 
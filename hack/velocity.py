@@ -0,0 +1,146 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+
+# Transaction fields a velocity rule can count by
+VELOCITY_KEYS = ("payer_email", "payee_id", "payer_ip")
+
+# Memory bounds: most keys tracked at once, seconds before an idle key is dropped, events kept per key
+VELOCITY_MAX_KEYS = int(os.getenv("VELOCITY_MAX_KEYS", "100000"))
+VELOCITY_IDLE_TTL = float(os.getenv("VELOCITY_IDLE_TTL", "3600"))
+VELOCITY_MAX_EVENTS = int(os.getenv("VELOCITY_MAX_EVENTS", "1000"))
+
+
+class VelocityRule:
+    """
+    More than max_count transactions, or more than max_amount in total, from one key within a window.
+    """
+
+    def __init__(self, key, window_minutes, max_count=None, max_amount=None):
+        if key not in VELOCITY_KEYS:
+            raise ValueError(f"Velocity key must be one of {', '.join(VELOCITY_KEYS)}, got {key!r}")
+        self.key = key
+        self.window_minutes = window_minutes
+        self.window = float(window_minutes) * 60
+        self.max_count = int(max_count) if max_count is not None else None
+        self.max_amount = float(max_amount) if max_amount is not None else None
+        self.max_amount_label = max_amount
+
+    @classmethod
+    def from_row(cls, rule):
+        return cls(rule["velocity_key"], rule["velocity_window_minutes"], rule.get("velocity_max_count"),
+                   rule.get("velocity_max_amount"))
+
+    def reasons(self, value, count, total):
+        reasons = []
+        if self.max_count is not None and count > self.max_count:
+            reasons.append(f"Velocity: {count} transactions from {self.key} {value} "
+                           f"in {self.window_minutes} min (> {self.max_count})")
+        if self.max_amount is not None and total > self.max_amount:
+            reasons.append(f"Velocity: {total:.2f} from {self.key} {value} "
+                           f"in {self.window_minutes} min (> {self.max_amount_label})")
+        return reasons
+
+
+class SlidingWindow:
+    """
+    Timestamps and amounts of one key's recent transactions with their running total.
+    """
+
+    __slots__ = ("events", "total", "last_seen")
+
+    def __init__(self, max_events):
+        self.events = deque(maxlen=max_events)
+        self.total = 0.0
+        self.last_seen = 0.0
+
+    def add(self, now, amount, window):
+        events = self.events
+        while events and events[0][0] <= now - window:
+            self.total -= events.popleft()[1]
+        if len(events) == events.maxlen:
+            # Full: the oldest in-window event falls out, so counts saturate at max_events
+            self.total -= events.popleft()[1]
+        events.append((now, amount))
+        self.total += amount
+        self.last_seen = now
+        return len(events), self.total
+
+
+class VelocityTracker:
+    """
+    In-memory sliding-window counters keyed by (field, window, value).
+
+    Memory is bounded by max_keys windows of at most max_events entries each;
+    keys idle for longer than idle_ttl, or least recently used beyond
+    max_keys, are evicted.
+    """
+
+    def __init__(self, max_keys=VELOCITY_MAX_KEYS, idle_ttl=VELOCITY_IDLE_TTL, max_events=VELOCITY_MAX_EVENTS):
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self.max_events = max_events
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def record(self, field, window, value, amount, now=None):
+        """
+        Add a transaction to a key's window.
+
+        Returns:
+            tuple: (transaction count, total amount) within the window, including this one
+        """
+        now = time.monotonic() if now is None else now
+        key = (field, window, value)
+        with self._lock:
+            sliding = self._windows.get(key)
+            if sliding is None:
+                sliding = self._windows[key] = SlidingWindow(self.max_events)
+            else:
+                self._windows.move_to_end(key)
+            result = sliding.add(now, amount, window)
+            self._evict(now)
+        return result
+
+    def _evict(self, now):
+        windows = self._windows
+        while windows:
+            oldest = next(iter(windows.values()))
+            if len(windows) <= self.max_keys and now - oldest.last_seen <= self.idle_ttl:
+                break
+            windows.popitem(last=False)
+
+
+class VelocityRules:
+    """
+    The active velocity rules, grouped so each (key, window) pair is counted once per transaction.
+    """
+
+    def __init__(self, rules, tracker):
+        self.tracker = tracker
+        self.groups = {}
+        for rule in rules:
+            self.groups.setdefault((rule.key, rule.window), []).append(rule)
+
+    def __bool__(self):
+        return bool(self.groups)
+
+    def check(self, transaction: dict):
+        """
+        Record a transaction and get the reasons for any velocity rule it breaks.
+        """
+        reasons = []
+        now = time.monotonic()
+        amount = transaction.get("transaction_amount") or 0
+        for (field, window), rules in self.groups.items():
+            value = transaction.get(field)
+            if value is None:
+                continue
+            count, total = self.tracker.record(field, window, value, amount, now)
+            for rule in rules:
+                reasons.extend(rule.reasons(value, count, total))
+        return reasons
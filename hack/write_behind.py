@@ -0,0 +1,228 @@
+import time
+import logging
+import threading
+from collections import deque
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    A bounded queue drained by a single background writer thread.
+
+    Items are handed to the flush callable in groups of up to max_batch,
+    waiting at most max_delay seconds after the first item of a group arrives,
+    so many small writes become one commit. Items queued together with
+    put_many are never split across commits.
+    """
+
+    def __init__(self, flush, max_size=10000, max_batch=500, max_delay=0.05, max_retries=1, name="write-behind"):
+        """
+        Args:
+            flush (callable): Persists a list of items in one commit
+            max_size (int): Maximum number of items waiting to be written
+            max_batch (int): Maximum number of items per flush, unless one put_many group is larger
+            max_delay (float): Seconds to wait for a group to fill up
+            max_retries (int): Attempts per group before it is dropped; a retry runs flush again on the
+                whole group, so only allow more than one when flush is idempotent
+            name (str): Name of the writer thread
+        """
+        self.flush = flush
+        self.max_size = max_size
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.name = name
+
+        # Entries are (enqueued_at, items); each put or put_many adds one
+        self._entries = deque()
+        self._size = 0
+        self._changed = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.enqueued = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_commit_latency = 0.0
+        self.last_commit_time = None
+
+    def start(self):
+        """
+        Start the writer thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop accepting items, write everything still queued and stop the writer thread.
+
+        Args:
+            timeout (float): Seconds to wait for the queue to drain
+        """
+        self._stopping.set()
+        with self._changed:
+            self._changed.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning(f"{self.name} stopped with {self.depth()} items still queued")
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stopping.is_set()
+
+    def put(self, item, timeout=None):
+        """
+        Queue an item for writing.
+
+        Args:
+            item: The item to pass to flush
+            timeout (float): Seconds to wait for space, None to fail immediately when full
+
+        Returns:
+            bool: True if the item was queued, False if the queue is full or stopped
+        """
+        return self._enqueue([item], timeout)
+
+    def put_many(self, items):
+        """
+        Queue several items, all or none of them, to be written in the same commit.
+
+        Args:
+            items (list): Items to pass to flush
+
+        Returns:
+            bool: True if every item was queued, False if the queue lacks room for all of them or is stopped
+        """
+        return self._enqueue(list(items), None)
+
+    def _enqueue(self, items, timeout):
+        if not self.running:
+            return False
+        if not items:
+            return True
+        with self._changed:
+            if timeout is not None:
+                self._changed.wait_for(lambda: not self.running or not self._is_full(len(items)), timeout)
+            if not self.running:
+                return False
+            queued = not self._is_full(len(items))
+            if queued:
+                self._entries.append((time.monotonic(), items))
+                self._size += len(items)
+                self._changed.notify_all()
+        with self._lock:
+            if queued:
+                self.enqueued += len(items)
+            else:
+                self.rejected += len(items)
+        return queued
+
+    def _is_full(self, count):
+        return 0 < self.max_size < self._size + count
+
+    def depth(self):
+        return self._size
+
+    def lag(self):
+        """
+        Age in seconds of the oldest item that has not been written yet.
+        """
+        with self._changed:
+            oldest = self._entries[0][0] if self._entries else None
+        return time.monotonic() - oldest if oldest is not None else 0.0
+
+    def _next_batch(self):
+        with self._changed:
+            if not self._entries and not self._stopping.is_set():
+                self._changed.wait(0.1)
+            if not self._entries:
+                return []
+
+            batch = [self._entries.popleft()]
+            count = len(batch[0][1])
+            deadline = time.monotonic() + self.max_delay
+            while count < self.max_batch:
+                if self._entries:
+                    # A group that would overflow this batch waits for the next one, whole
+                    if count + len(self._entries[0][1]) > self.max_batch:
+                        break
+                    entry = self._entries.popleft()
+                    batch.append(entry)
+                    count += len(entry[1])
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping.is_set():
+                    break
+                self._changed.wait(remaining)
+
+            self._size -= count
+            # Wake producers waiting for space
+            self._changed.notify_all()
+        return batch
+
+    def _write(self, batch):
+        items = [item for _, group in batch for item in group]
+        for attempt in range(1, self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                self.flush(items)
+            except Exception as e:
+                logger.error(f"{self.name} failed to write {len(items)} items (attempt {attempt}): {e}")
+                if attempt < self.max_retries:
+                    time.sleep(min(0.1 * 2 ** attempt, 2.0))
+                continue
+
+            with self._lock:
+                self.written += len(items)
+                self.batches += 1
+                self.last_batch_size = len(items)
+                self.last_commit_latency = time.monotonic() - start
+                self.last_commit_time = time.time()
+            return
+
+        with self._lock:
+            self.failed += len(items)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+            elif self._stopping.is_set():
+                break
+
+    def stats(self):
+        """
+        Get queue and writer metrics.
+
+        Returns:
+            dict: Queue depth, lag, and counts of queued, written and failed items
+        """
+        with self._lock:
+            return {
+                "running": self.running,
+                "depth": self.depth(),
+                "max_size": self.max_size,
+                "lag_seconds": self.lag(),
+                "enqueued": self.enqueued,
+                "rejected": self.rejected,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_batch_size": self.last_batch_size,
+                "last_commit_latency": self.last_commit_latency,
+                "last_commit_time": self.last_commit_time
+            }
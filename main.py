@@ -10,6 +10,11 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# The rules view imports its storage and expression modules from hack/
+HACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hack")
+if HACK_DIR not in sys.path:
+    sys.path.insert(0, HACK_DIR)
+
 # Page configuration
 st.set_page_config(
     page_title="Fraud Detection System",
@@ -231,13 +236,16 @@ elif st.session_state.active_view == "rules" and st.session_state.logged_in:
     st.title("⚙️ Fraud Detection Rule Management")
 
     # Import rule management functions
-    import mysql.connector
     import pandas as pd
 
+    from storage import get_storage
+    from rule_expr import Expression, ExpressionError
+
 
-    # ---- MySQL Connection ----
-    def get_db_connection():
-        return mysql.connector.connect(
+    # ---- Rule Storage ----
+    def get_rule_storage():
+        # The backend and its pooled connections survive Streamlit reruns
+        return get_storage(
             host=os.getenv("DB_HOST", "127.0.0.1"),
             user=os.getenv("DB_USERNAME", "root"),
             password=os.getenv("DB_PASSWORD", "password"),
@@ -248,11 +256,7 @@ elif st.session_state.active_view == "rules" and st.session_state.logged_in:
     # ---- Function to Fetch Rules ----
     def fetch_rules():
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM fraud_rules WHERE is_active = 1")
-            rules = cursor.fetchall()
-            conn.close()
+            rules = get_rule_storage().fetch_rules()
             return pd.DataFrame(rules) if rules else pd.DataFrame()
         except Exception as e:
             st.error(f"Error fetching rules: {str(e)}")
@@ -262,37 +266,7 @@ elif st.session_state.active_view == "rules" and st.session_state.logged_in:
     # ---- Function to Add a Rule ----
     def add_rule(rule_type, value):
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            if rule_type == "Threshold Value":
-                cursor.execute(
-                    """INSERT INTO fraud_rules (rule_type, threshold, is_active) 
-                    VALUES (%s, %s, 1)""", (rule_type, value)
-                )
-            elif rule_type == "Blocked IP":
-                cursor.execute(
-                    """INSERT INTO fraud_rules (rule_type, blocked_ip, is_active) 
-                    VALUES (%s, %s, 1)""", (rule_type, value)
-                )
-            elif rule_type == "Blocked Payment Gateway":
-                cursor.execute(
-                    """INSERT INTO fraud_rules (rule_type, blocked_payment_gateway, is_active) 
-                    VALUES (%s, %s, 1)""", (rule_type, value)
-                )
-            elif rule_type == "Blocked Browser":
-                cursor.execute(
-                    """INSERT INTO fraud_rules (rule_type, blocked_payer_browser, is_active) 
-                    VALUES (%s, %s, 1)""", (rule_type, value)
-                )
-            elif rule_type == "Blocked Email":
-                cursor.execute(
-                    """INSERT INTO fraud_rules (rule_type, blocked_email, is_active) 
-                    VALUES (%s, %s, 1)""", (rule_type, value)
-                )
-
-            conn.commit()
-            conn.close()
+            get_rule_storage().add_rule(rule_type, value)
             return True
         except Exception as e:
             st.error(f"Error adding rule: {str(e)}")
@@ -301,11 +275,7 @@ elif st.session_state.active_view == "rules" and st.session_state.logged_in:
 
     def delete_rule(rule_id):
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM fraud_rules WHERE id = %s", (rule_id,))
-            conn.commit()
-            conn.close()
+            get_rule_storage().delete_rule(rule_id)
             return True
         except Exception as e:
             st.error(f"Error deleting rule: {str(e)}")
@@ -329,11 +299,36 @@ elif st.session_state.active_view == "rules" and st.session_state.logged_in:
             "Blocked IP",
             "Blocked Payment Gateway",
             "Blocked Browser",
-            "Blocked Email"
+            "Blocked Email",
+            "Velocity",
+            "Expression"
         ])
 
         if rule_type == "Threshold Value":
             value = st.number_input("Enter Maximum Threshold Value", min_value=0.0)
+        elif rule_type == "Velocity":
+            # A limit of 0 leaves that limit unset
+            max_count = st.number_input("Maximum Transactions in Window", min_value=0, step=1)
+            max_amount = st.number_input("Maximum Total Amount in Window", min_value=0.0)
+            value = {
+                "key": st.selectbox("Count Transactions By", ["payer_email", "payee_id", "payer_ip"]),
+                "window_minutes": st.number_input("Window (minutes)", min_value=1, value=10, step=1),
+                "max_count": max_count or None,
+                "max_amount": max_amount or None
+            } if max_count or max_amount else None
+        elif rule_type == "Blocked IP":
+            value = st.text_input("Enter IP Address or CIDR Range (e.g. 10.0.0.0/16) to Block")
+        elif rule_type == "Expression":
+            value = st.text_input("Enter Rule Expression", placeholder='amount > 5000 and channel == "Mobile"')
+            st.caption("Fields: amount, channel, payment_mode, gateway, email, mobile, card_brand, ip, browser, "
+                       "payee, date. Operators: == != < <= > >= in, not in, contains, startswith, endswith, "
+                       "and, or, not.")
+            if value:
+                try:
+                    Expression(value)
+                except ExpressionError as e:
+                    st.error(f"Invalid expression: {e}")
+                    value = None
         else:
             value = st.text_input(f"Enter {rule_type.replace('Blocked ', '')} to Block")
 